@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its total covers every other middleware too
+    "video_collection.timing.server_timing_middleware",
+    # outside everything that reads the body, so they all see it uncompressed
+    "video_collection.compression.compression_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -48,13 +53,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "video_collection.routing.primary_stickiness_middleware",
 ]
 
 ROOT_URLCONF = "video.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django's backend, timing renders for the Server-Timing header
+        "BACKEND": "video_collection.timing.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -78,9 +85,52 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # keep connections open between requests, checking they still work
+        # before reusing one
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # take the write lock when a transaction starts, so two adds
+            # queue on busy_timeout rather than one failing on lock upgrade
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
+# Read replica for the video list (and search) and detail pages, see
+# video_collection/routing.py. Point VIDEO_DB_REPLICA at a copy of the database
+# kept up to date by your replication tool to turn it on; without it the
+# "replica" alias is the primary's file and nothing reads from it
+
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "NAME": os.environ.get("VIDEO_DB_REPLICA", DATABASES["default"]["NAME"]),
+}
+
+DATABASE_ROUTERS = ["video_collection.routing.ReplicaRouter"]
+
+VIDEO_READ_REPLICA = "replica" if os.environ.get("VIDEO_DB_REPLICA") else None
+
+# seconds a client reads from the primary after a POST, so it sees its own
+# changes however far the replica is behind
+VIDEO_PRIMARY_STICKY_SECONDS = 10
+
+# seconds anything read from the replica (pages, validators, hot videos) is
+# cached for. Replication doesn't move the collection version on, so this is
+# how long a change can stay hidden once the replica has it
+VIDEO_REPLICA_CACHE_TIMEOUT = 5
+
+# Run on every new SQLite connection, see video_collection/sqlite.py.
+# busy_timeout comes first so switching to WAL waits for other connections
+
+SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,  # ms
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative means KiB, so 64 MiB
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -118,7 +168,141 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# collectstatic puts content-hashed copies of the files here, plus gzip and
+# brotli (if installed) versions, and the app serves them, see
+# video_collection/assets.py
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "video_collection.assets.CompressedManifestStaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Video list pagination
+# page size can be overridden per request with ?page_size=, up to the max
+
+VIDEO_LIST_PAGE_SIZE = 50
+
+VIDEO_LIST_MAX_PAGE_SIZE = 200
+
+
+# Fuzzy (misspelling tolerant) name search
+# similarity is the fraction of trigrams shared, from 0 to 1
+
+FUZZY_SEARCH_LIMIT = 20
+
+FUZZY_SEARCH_THRESHOLD = 0.3
+
+
+# Search box autocomplete
+# names are held in memory per process, at most AUTOCOMPLETE_MAX_ENTRIES of them;
+# lookups past the last one held go to the database
+
+AUTOCOMPLETE_LIMIT = 10
+
+AUTOCOMPLETE_MAX_ENTRIES = 200_000
+
+
+# Caching
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# VIDEO_CACHE picks the backend for cached video pages: locmem is per process,
+# file and db are shared between processes (db needs `manage.py createcachetable`)
+
+VIDEO_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "video-pages",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+    },
+    "db": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "video_collection_cache",
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "videos": VIDEO_CACHE_BACKENDS[os.environ.get("VIDEO_CACHE", "locmem")],
+}
+
+VIDEO_CACHE_ALIAS = "videos"
+
+# seconds; entries are invalidated on change anyway, this just bounds their size
+VIDEO_CACHE_TIMEOUT = 60 * 60
+
+
+# Rendered video list rows kept in memory (per process), least recently used
+# dropped first
+
+VIDEO_ROW_CACHE_SIZE = 5000
+
+
+# Video objects for the detail pages kept in memory (per process), least
+# recently requested dropped first
+
+VIDEO_HOT_CACHE_SIZE = 1000
+
+
+# How each view embeds videos: "iframe" loads the YouTube player straight
+# away, "facade" shows a lightweight placeholder and loads the player on click
+
+VIDEO_EMBED_MODES = {
+    "video_list": "facade",
+    "video_detail": "iframe",
+}
+
+# Serve home, add, video list and detail from the async views. Worth it when
+# running under ASGI (video/asgi.py), where each sync view costs a thread hop
+
+VIDEO_ASYNC_VIEWS = os.environ.get("VIDEO_ASYNC_VIEWS") == "1"
+
+if VIDEO_ASYNC_VIEWS:
+    # under ASGI queries run in sync_to_async threads, not the one where the
+    # request_started/finished handlers close old connections, so persistent
+    # connections are never closed. Django's docs say to turn them off there
+    for database in DATABASES.values():
+        database["CONN_MAX_AGE"] = 0
+
+
+# Request timing (Server-Timing header), see video_collection/timing.py.
+# Slower requests are logged with their SQL; the bucket bounds (ms) are for
+# the per URL name histograms
+
+VIDEO_SLOW_REQUEST_MS = 500
+
+VIDEO_TIMING_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+# Prometheus metrics at /metrics, see video_collection/metrics.py. With several
+# worker processes set VIDEO_METRICS_DIR to a directory they all share, and
+# each writes its numbers there at most every VIDEO_METRICS_FLUSH_SECONDS
+
+VIDEO_METRICS_DIR = os.environ.get("VIDEO_METRICS_DIR")
+
+VIDEO_METRICS_FLUSH_SECONDS = 5
+
+
+# Response compression, see video_collection/compression.py. Higher levels
+# save a few more bytes for a lot more CPU, `manage.py benchmark compression`
+# measures both
+
+VIDEO_GZIP_LEVEL = 6
+
+VIDEO_BROTLI_QUALITY = 4
+
+VIDEO_COMPRESS_MIN_BYTES = 1024
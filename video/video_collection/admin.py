@@ -1,4 +1,235 @@
-from django.contrib import admin
-from .models import Video
+"""
+Admin for videos, kept to indexed queries so the changelist stays fast with
+millions of rows.
 
-admin.site.register(Video)
+Django's defaults count the whole table (twice when searching), search with
+LIKE '%term%' over every row, and delete by loading every selected video.
+Instead counts stop at CappedCountPaginator.limit, search uses the FTS index
+for names and the unique index for video IDs, the date hierarchy and filters
+are range lookups on indexed columns, and the actions are a single UPDATE (see
+VideoQuerySet) or DELETE (see VideoAdmin.delete_queryset) however many videos
+are selected.
+"""
+
+import datetime
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from .models import Video, VideoQuerySet, VideoSearchEntry, VideoTrigram, videos_bulk_changed
+from .search import fts_query, search_index_available
+from .youtube import parse_video_id
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Counts no further than `limit` rows, so a page never costs a COUNT of the
+    whole table. Pages past the limit can't be reached, search or filter to
+    narrow things down instead.
+    """
+
+    limit = 10_000
+
+    @cached_property
+    def _counted(self):
+        return self.object_list.order_by()[: self.limit + 1].count()
+
+    @property
+    def count(self):
+        return min(self._counted, self.limit)
+
+    @property
+    def capped(self):
+        """Whether there are more rows than `count`."""
+        return self._counted > self.limit
+
+
+def _truncate(value, kind):
+    if kind == "year":
+        return value.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    if kind == "month":
+        return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_period(start, kind):
+    if kind == "year":
+        return start.replace(year=start.year + 1)
+    if kind == "month":
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    return start + datetime.timedelta(days=1)
+
+
+class ChangeListQuerySet(VideoQuerySet):
+    """
+    The changelist's queryset, with the date hierarchy's queries answered from
+    the created_at index rather than by reading every row.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # SQLite answers a lone MIN or MAX of an indexed column from one end of
+        # the index, but both in one query scan all of it
+        if args or len(kwargs) < 2 or not all(
+            isinstance(value, (Min, Max)) for value in kwargs.values()
+        ):
+            return super().aggregate(*args, **kwargs)
+        results = {}
+        for name, value in kwargs.items():
+            results.update(super().aggregate(**{name: value}))
+        return results
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        """
+        A list of the years, months or days with rows in them. Rather than a
+        DISTINCT over every row this seeks to the first row of each one in
+        turn, so costs one indexed query per period (at most 32).
+        """
+        if kind not in ("year", "month", "day"):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        tz = tzinfo or timezone.get_current_timezone()
+        values = (
+            self.filter(**{f"{field_name}__isnull": False})
+            .order_by(field_name)
+            .values_list(field_name, flat=True)
+        )
+        periods = []
+        value = values.first()
+        while value is not None:
+            start = _truncate(timezone.localtime(value, tz).replace(tzinfo=None), kind)
+            periods.append(timezone.make_aware(start, tz))
+            after = timezone.make_aware(_next_period(start, kind), tz)
+            value = values.filter(**{f"{field_name}__gte": after}).first()
+        return periods[::-1] if order == "DESC" else periods
+
+
+class VideoChangeList(ChangeList):
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        # rows only show the list_display columns, and notes can be long
+        queryset = queryset.defer("notes", "sort_key")
+        return ChangeListQuerySet(queryset.model, queryset.query, using=queryset.db)
+
+
+@admin.register(Video)
+class VideoAdmin(admin.ModelAdmin):
+    list_display = ["display_name", "video_id", "created_at", "updated_at"]
+    # every sortable column has an index to sort with
+    sortable_by = ["display_name", "video_id", "created_at", "updated_at"]
+    # same indexed ordering as the video list
+    ordering = ["sort_key", "pk"]
+    date_hierarchy = "created_at"
+    list_filter = [("updated_at", admin.DateFieldListFilter)]
+    show_facets = admin.ShowFacets.NEVER
+    show_full_result_count = False
+    paginator = CappedCountPaginator
+    search_fields = ["name", "=video_id"]  # see get_search_results
+    search_help_text = "Words from the name, or a YouTube video ID or URL."
+    actions = ["clear_notes", "delete_videos"]
+
+    @admin.display(description="name", ordering="sort_key")
+    def display_name(self, video):
+        return video.name
+
+    def action_checkbox(self, video):
+        # Django labels the checkbox with str(video), which includes the notes
+        attrs = {
+            "class": "action-select",
+            "aria-label": format_html("Select this object for an action - {}", video.name),
+        }
+        checkbox = forms.CheckboxInput(attrs, lambda value: False)
+        return checkbox.render(helpers.ACTION_CHECKBOX_NAME, str(video.pk))
+
+    def get_changelist(self, request, **kwargs):
+        return VideoChangeList
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # loads and collects every selected video, delete_videos doesn't
+        actions.pop("delete_selected", None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        # subqueries rather than a join to the FTS table, so they can be ORed
+        query = fts_query(search_term)
+        if query is None:
+            matches = Q()
+        elif search_index_available(queryset.db):
+            names = VideoSearchEntry.objects.using(queryset.db).filter(match=f"name : ({query})")
+            matches = Q(pk__in=names.values("pk"))
+        else:
+            matches = Q(name__icontains=search_term)
+        video_ids = sorted({search_term, parse_video_id(search_term)} - {None})
+        matches |= Q(video_id__in=video_ids)
+        return queryset.filter(matches), False
+
+    @admin.action(description="Clear notes of selected videos", permissions=["change"])
+    def clear_notes(self, request, queryset):
+        updated = queryset.update(notes="")
+        self.message_user(request, f"Cleared the notes of {updated} videos.", messages.SUCCESS)
+
+    @admin.action(description="Delete selected videos", permissions=["delete"])
+    def delete_videos(self, request, queryset):
+        # unlike delete_selected this doesn't list what's about to go, or log
+        # each deletion, as both mean loading every selected video
+        if request.POST.get("post") != "yes":
+            return self._confirm_delete(request, queryset)
+        deleted = self.delete_queryset(request, queryset)
+        self.message_user(request, f"Deleted {deleted} videos.", messages.SUCCESS)
+
+    def delete_queryset(self, request, queryset):
+        """
+        Delete the videos in `queryset` and return how many there were.
+        Django's would load every one to send post_delete for it; this is one
+        DELETE for the trigram rows and one for the videos, however many
+        match. The FTS triggers clean up the search index, and one log entry
+        records the lot.
+        """
+        using = queryset.db
+        with transaction.atomic(using=using):
+            VideoTrigram.objects.using(using).filter(
+                video__in=queryset.values("pk")
+            )._raw_delete(using)
+            deleted = queryset._raw_delete(using)
+            LogEntry.objects.using(using).create(
+                user_id=request.user.pk,
+                content_type_id=ContentType.objects.get_for_model(Video).pk,
+                object_repr=f"{deleted} videos",
+                action_flag=DELETION,
+                change_message=f"Deleted {deleted} videos with the delete action.",
+            )
+        videos_bulk_changed.send(sender=Video, removed=deleted)
+        return deleted
+
+    def _confirm_delete(self, request, queryset):
+        paginator = self.get_paginator(request, queryset, self.list_per_page)
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Delete videos?",
+            "opts": self.model._meta,
+            "count": paginator.count,
+            "capped": paginator.capped,
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "select_across": request.POST.get("select_across", "0"),
+        }
+        return TemplateResponse(
+            request, "admin/video_collection/video/delete_videos_confirmation.html", context
+        )
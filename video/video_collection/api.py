@@ -0,0 +1,166 @@
+"""
+Read-only JSON API over the collection, for other services.
+
+    GET api/videos                          every video, by name
+    GET api/videos?search=yoga              full-text search, best match first
+    GET api/videos?search=yogga&fuzzy=1     top matches for a misspelled name
+    GET api/videos/<pk>, api/v/<video_id>   one video
+
+Lists are keyset paginated like the HTML list (see pagination.py): up to
+`page_size` videos, with `next` and `previous` URLs carrying the cursors.
+There's no total count, as that would be a COUNT on every page.
+
+`fields=name,url` picks the fields returned from FIELDS, and id is always
+included. By default that's everything but notes, which are then never
+loaded. The query fetches only those columns, as plain dicts from .values()
+that are serialized as they are, without building a model instance per row.
+Fuzzy search ranks Video objects, so loads them with .only() the same columns.
+
+Responses get the same ETag and Last-Modified validators as the HTML pages
+(see conditional.py), and are cached the same way (see cache.py).
+"""
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_safe
+
+from . import hot, metrics
+from .cache import cache_response
+from .conditional import (
+    detail_etag,
+    detail_last_modified,
+    list_etag,
+    list_last_modified,
+)
+from .models import Video
+from .pagination import InvalidCursor, keyset_paginate
+from .routing import read_from_replica
+from .search import fuzzy_search_videos, search_videos
+from .views import _page_size
+
+FIELDS = ("id", "name", "url", "video_id", "notes", "created_at", "updated_at")
+
+DEFAULT_FIELDS = tuple(field for field in FIELDS if field != "notes")
+
+
+class InvalidFields(Exception):
+    pass
+
+
+def _fields(request):
+    # the fields to return besides id, which is always there (as the pk)
+    requested = request.GET.get("fields")
+    if not requested:
+        fields = DEFAULT_FIELDS
+    else:
+        fields = [field.strip() for field in requested.split(",") if field.strip()]
+        unknown = [field for field in fields if field not in FIELDS]
+        if unknown:
+            raise InvalidFields(
+                f"Unknown fields {', '.join(unknown)}, choose from {', '.join(FIELDS)}"
+            )
+    return list(dict.fromkeys(field for field in fields if field != "id"))
+
+
+def _from_row(row, fields):
+    return {"id": row["pk"], **{field: row[field] for field in fields}}
+
+
+def _from_video(video, fields):
+    return {"id": video.pk, **{field: getattr(video, field) for field in fields}}
+
+
+def _error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _page_url(request, **cursor):
+    # relative, as cached responses can be served to any host name
+    (direction, value), = cursor.items()
+    if value is None:
+        return None
+    params = request.GET.copy()
+    params.pop("after", None)
+    params.pop("before", None)
+    params[direction] = value
+    return f"{request.path}?{params.urlencode()}"
+
+
+@require_safe
+@metrics.count_searches("search")
+@read_from_replica
+@condition(etag_func=list_etag, last_modified_func=list_last_modified)
+@cache_response
+def video_list(request):
+    try:
+        fields = _fields(request)
+    except InvalidFields as e:
+        return _error(str(e), 400)
+
+    videos = Video.objects.all()
+    sort_key = "sort_key"
+    search_term = request.GET.get("search", "").strip()
+    if search_term and request.GET.get("fuzzy") in ("1", "true", "on"):
+        # only the top matches, so no paging. ranking needs the name and
+        # sort key, which would otherwise be loaded one video at a time
+        matches = fuzzy_search_videos(
+            videos.only(*fields, "name", "sort_key"),
+            search_term,
+            settings.FUZZY_SEARCH_LIMIT,
+            settings.FUZZY_SEARCH_THRESHOLD,
+        )
+        metrics.record_search(request, len(matches))
+        return JsonResponse(
+            {
+                "results": [_from_video(video, fields) for video in matches],
+                "next": None,
+                "previous": None,
+            }
+        )
+    if search_term:
+        videos, sort_key = search_videos(videos, search_term)
+
+    after, before = request.GET.get("after"), request.GET.get("before")
+    try:
+        # the sort key and pk are needed for the cursors
+        page = keyset_paginate(
+            videos.values("pk", sort_key, *fields),
+            sort_key,
+            _page_size(request),
+            after=after,
+            before=before,
+        )
+    except InvalidCursor:
+        return _error("Invalid page cursor", 400)
+    if search_term and after is None and before is None:
+        metrics.record_search(request, len(page))
+
+    return JsonResponse(
+        {
+            "results": [_from_row(row, fields) for row in page],
+            "next": _page_url(request, after=page.next_cursor),
+            "previous": _page_url(request, before=page.previous_cursor),
+        }
+    )
+
+
+@require_safe
+@read_from_replica
+@condition(etag_func=detail_etag, last_modified_func=detail_last_modified)
+@cache_response
+def video_detail(request, video_pk=None, video_id=None):
+    try:
+        fields = _fields(request)
+    except InvalidFields as e:
+        return _error(str(e), 400)
+
+    field, value = hot.detail_lookup(video_pk, video_id)
+    # a video the HTML pages made hot is already in memory, see hot.py
+    video = hot.peek(field, value)
+    if video is not None:
+        return JsonResponse(_from_video(video, fields))
+    try:
+        row = Video.objects.values("pk", *fields).get(**{field: value})
+    except Video.DoesNotExist:
+        return _error("No video matches the given query", 404)
+    return JsonResponse(_from_row(row, fields))
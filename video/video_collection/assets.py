@@ -0,0 +1,248 @@
+"""
+Static files served by the app itself, so it needs no separate web server.
+
+collectstatic (with CompressedManifestStaticFilesStorage, see settings.STORAGES)
+copies each file to STATIC_ROOT under a name with a hash of its content, e.g.
+css/style.3f2a9c1e0b7d.css, and writes .gz and .br (when the brotli package
+is installed) copies of the text ones next to it. The {% static %} tag then
+links to the hashed names.
+
+serve() answers the requests for them. A hashed name can never change
+content, so it's sent with a one year immutable Cache-Control and browsers
+don't even revalidate. When the client accepts it the .br or .gz copy is sent
+instead, with no compression work per request. Single byte ranges are
+supported for uncompressed responses.
+
+Lookups in STATIC_ROOT are cached per process, as it only changes on deploy
+(collectstatic, then restart). Files that haven't been collected, in
+development say, are found through the staticfiles finders on every request
+and sent with a short max-age, so edits to them show up straight away.
+"""
+
+import functools
+import gzip
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".mjs", ".svg", ".html", ".txt", ".json", ".xml", ".map"}
+
+# smaller files aren't worth a compressed copy
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# names collectstatic gives files, with a 12 hex digit content hash
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# (Accept-Encoding token, file suffix), best first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz and .br copies of text files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        collected = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception) and not dry_run:
+                collected.update([name, hashed_name])
+            yield name, hashed_name, processed
+        for name in sorted(filter(None, collected)):
+            if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS:
+                self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        path = Path(self.path(name))
+        content = path.read_bytes()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        # mtime=0 so collecting the same file twice gives the same bytes
+        variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, mode=brotli.MODE_TEXT)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(content) * 0.95:
+                path.with_name(path.name + suffix).write_bytes(compressed)
+
+    def stored_name(self, name):
+        # before collectstatic has run (development, tests) link to the
+        # plain name, which serve() finds through the finders
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+class StaticFile:
+
+    def __init__(self, path, stat, variants):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.version = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        self.variants = variants  # {encoding: (path, size)}, best first
+        self.content_type, _ = mimetypes.guess_type(path)
+
+    def etag(self, encoding):
+        # each encoding is a different set of bytes, so gets its own tag
+        return quote_etag(f"{self.version}-{encoding}" if encoding else self.version)
+
+
+def find(static_root, name):
+    """The StaticFile for `name` (a path under STATIC_URL), or None."""
+    if static_root:
+        static_file = find_collected(static_root, name)
+        if static_file is not None:
+            return static_file
+    # not collected, in development say, where files get edited. looked up
+    # (and stat'ed) every time so the size and ETag follow the edits
+    try:
+        path = finders.find(name)
+    except SuspiciousFileOperation:  # outside the static directories, e.g. ../
+        return None
+    if path is None:
+        return None
+    return _static_file(path)
+
+
+@functools.lru_cache(maxsize=1024)
+def find_collected(static_root, name):
+    """find() for files collectstatic copied to `static_root`, cached."""
+    try:
+        path = safe_join(static_root, name)
+    except SuspiciousFileOperation:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return _static_file(path)
+
+
+def _static_file(path):
+    variants = {}
+    for encoding, suffix in ENCODINGS:
+        try:
+            variants[encoding] = (path + suffix, os.stat(path + suffix).st_size)
+        except OSError:
+            pass
+    return StaticFile(path, os.stat(path), variants)
+
+
+def accepts_encoding(request, encoding):
+    """Whether the request's Accept-Encoding allows `encoding` (q=0 refuses it)."""
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _byte_range(header, size):
+    # (start, end) inclusive, or None for a header we don't handle (so the
+    # whole file is sent), or False when it can't be satisfied
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:  # the last `end` bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve(request, path):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponse(status=405, headers={"Allow": "GET, HEAD"})
+    static_file = find(str(settings.STATIC_ROOT or ""), path)
+    if static_file is None:
+        raise Http404(f"{path} not found")
+
+    byte_range = None
+    if "Range" in request.headers and _if_range_matches(request, static_file):
+        byte_range = _byte_range(request.headers["Range"], static_file.size)
+    # ranges are of the plain file, so no compressed copy for those
+    encoding = None if byte_range else _pick_encoding(request, static_file)
+
+    headers = {
+        "Cache-Control": IMMUTABLE if HASHED_NAME.search(path) else "public, max-age=60",
+        "ETag": static_file.etag(encoding),
+        "Last-Modified": http_date(static_file.mtime),
+        "Accept-Ranges": "bytes",
+    }
+    if static_file.variants:
+        headers["Vary"] = "Accept-Encoding"
+
+    if _not_modified(request, static_file, headers["ETag"]):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type = static_file.content_type or "application/octet-stream"
+    if byte_range is False:
+        return HttpResponse(
+            status=416, headers={**headers, "Content-Range": f"bytes */{static_file.size}"}
+        )
+    if byte_range is not None:
+        start, end = byte_range
+        with open(static_file.path, "rb") as f:
+            f.seek(start)
+            content = f.read(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{static_file.size}"
+        return HttpResponse(content, status=206, content_type=content_type, headers=headers)
+
+    file_path, size = static_file.variants.get(encoding, (static_file.path, static_file.size))
+    response = FileResponse(open(file_path, "rb"), content_type=content_type, headers=headers)
+    # FileResponse would name the .gz or .br file here
+    del response["Content-Disposition"]
+    response["Content-Length"] = size
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return response
+
+
+def _pick_encoding(request, static_file):
+    for encoding in static_file.variants:  # best first
+        if accepts_encoding(request, encoding):
+            return encoding
+    return None
+
+
+def _not_modified(request, static_file, etag):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return any(
+            tag.strip().removeprefix("W/") == etag or tag.strip() == "*"
+            for tag in if_none_match.split(",")
+        )
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and static_file.mtime <= since
+
+
+def _if_range_matches(request, static_file):
+    # a Range with an If-Range for an older version gets the whole new file
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == static_file.etag(None)
+    return parse_http_date_safe(if_range) == static_file.mtime
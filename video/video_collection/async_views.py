@@ -0,0 +1,160 @@
+"""
+Async versions of the home, add, video list and detail pages, served instead
+of the ones in views.py when settings.VIDEO_ASYNC_VIEWS is on. Under ASGI a
+sync view costs a thread hop per request; these query through the async ORM
+(aget, acount, async for) and only drop into a thread for the bits Django has
+no async API for (form validation and saving, schema introspection).
+
+Templates render on the event loop, which is only safe once every queryset
+in the context has been loaded, see arender.
+"""
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db import IntegrityError
+from django.db.models.query import QuerySet
+from django.http import Http404
+from django.shortcuts import redirect, render
+
+from . import hot, metrics
+from .cache import cache_response
+from .conditional import (
+    async_condition,
+    detail_etag,
+    detail_last_modified,
+    list_etag,
+    list_last_modified,
+)
+from .forms import SearchForm, VideoForm
+from .models import Video
+from .pagination import InvalidCursor, akeyset_paginate
+from .routing import read_from_replica
+from .views import _embed_mode, _page_query, _page_size
+
+
+def arender(request, template_name, context):
+    """
+    render() for the async views. A lazy queryset in the context would query
+    from inside the template, which Django refuses to do on the event loop,
+    so fail early with a clearer error instead.
+    """
+    for name, value in context.items():
+        if isinstance(value, QuerySet):
+            raise TypeError(f"{name!r} is an unevaluated QuerySet, load it before rendering")
+    return render(request, template_name, context)
+
+
+@cache_response
+async def home(request):
+    app_name = "Music Videos"
+    return arender(request, "video_collection/home.html", {"app_name": app_name})
+
+
+async def add(request):
+    if request.method == "POST":
+        new_video_form = VideoForm(request.POST)
+        # validation checks the database for duplicates, and forms are sync only
+        if await sync_to_async(new_video_form.is_valid)():
+            try:
+                await new_video_form.instance.asave()  # no m2m fields to save
+                return redirect("video_list")
+            except IntegrityError:
+                # someone else added it between the form's check and our save
+                metrics.inc("video_add_failures_total", reason="duplicate")
+                messages.warning(request, "You already added that video")
+        elif new_video_form.has_error("url", "invalid_youtube_url"):
+            metrics.inc("video_add_failures_total", reason="invalid_url")
+            messages.warning(request, "Invalid YouTube URL")
+        elif new_video_form.has_error("url", "duplicate"):
+            metrics.inc("video_add_failures_total", reason="duplicate")
+            messages.warning(request, "You already added that video")
+        else:
+            messages.warning(request, "Please check the data entered.")
+
+        return await _render_add(request, new_video_form)
+
+    return await _render_add(request, VideoForm())
+
+
+async def _render_add(request, new_video_form):
+    # add.html shows messages, which can read the session, and sessions are
+    # sync only, so this page renders in a thread
+    return await sync_to_async(render)(
+        request, "video_collection/add.html", {"new_video_form": new_video_form}
+    )
+
+
+@metrics.count_searches("search_term")
+@read_from_replica
+@async_condition(etag_func=list_etag, last_modified_func=list_last_modified)
+@cache_response
+async def video_list(request):
+    search_form = SearchForm(request.GET)
+    videos = Video.objects.all()
+    sort_key = "sort_key"
+
+    if search_form.is_valid():
+        search_term = search_form.cleaned_data["search_term"]
+        if search_form.cleaned_data["fuzzy"]:
+            videos = await search_form.afuzzy_search(videos)
+            metrics.record_search(request, len(videos))
+            return arender(
+                request,
+                "video_collection/video_list.html",
+                {
+                    "videos": videos,
+                    "total_count": len(videos),
+                    "search_form": search_form,
+                    "embed_mode": _embed_mode("video_list"),
+                },
+            )
+        videos, sort_key = await search_form.asearch(videos)
+    else:
+        search_term = None
+        search_form = SearchForm()
+
+    try:
+        page = await akeyset_paginate(
+            videos,
+            sort_key,
+            _page_size(request),
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
+    except InvalidCursor:
+        raise Http404("Invalid page")
+
+    total_count = await videos.acount()
+    if search_term is not None:
+        metrics.record_search(request, total_count)
+
+    return arender(
+        request,
+        "video_collection/video_list.html",
+        {
+            "videos": page,
+            "page": page,
+            "total_count": total_count,
+            "next_query": _page_query(request, search_term, after=page.next_cursor),
+            "previous_query": _page_query(
+                request, search_term, before=page.previous_cursor
+            ),
+            "search_form": search_form,
+            "embed_mode": _embed_mode("video_list"),
+        },
+    )
+
+
+@read_from_replica
+@async_condition(etag_func=detail_etag, last_modified_func=detail_last_modified)
+@cache_response
+async def video_detail(request, video_pk=None, video_id=None):
+    video = await hot.aget_video(*hot.detail_lookup(video_pk, video_id))
+    if video is None:
+        raise Http404("No Video matches the given query.")
+
+    return arender(
+        request,
+        "video_collection/video_detail.html",
+        {"video": video, "embed_mode": _embed_mode("video_detail")},
+    )
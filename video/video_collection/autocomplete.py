@@ -0,0 +1,184 @@
+"""
+In-process prefix index of video names for the search box autocomplete.
+
+Names are kept in one sorted list of (sort_key, name, pk) tuples, so a prefix
+lookup is a binary search followed by a short slice, and memory is a tuple
+per video rather than the node-per-character of a dict trie. The index is
+loaded from the database on first use and then kept current by the signal
+receivers in signals.py, so typing doesn't query the database.
+
+At most AUTOCOMPLETE_MAX_ENTRIES names are held, the first ones in name
+order. Past that the index remembers where it stops (the boundary), and the
+rest of a lookup that runs into it comes from the sort_key index in the
+database, so every prefix still completes.
+
+Each process has its own copy, which remembers the collection version (see
+cache.py) it was loaded under. This process's own changes move the version
+on as they're applied (see version_bumped), so the index stays current
+without a reload. Changes made in another process (another worker, a
+management command) move the version without that, and the next lookup
+reloads the index. Bulk changes reload it through the videos_bulk_changed
+signal.
+"""
+
+import bisect
+import threading
+
+from django.conf import settings
+
+from .cache import collection_version
+from .models import Video, sort_key_for
+
+
+class PrefixIndex:
+
+    def __init__(self, max_entries, version=None):
+        self.max_entries = max_entries
+        self.version = version  # the collection version the contents are from
+        self._entries = []  # sorted (sort_key, name, pk)
+        self._by_pk = {}
+        # sort keys from here on are only in the database, None when it all fits
+        self._boundary = None
+        self._lock = threading.Lock()
+
+    def load(self, videos):
+        """Replace the contents with (pk, name) pairs in name order, up to max_entries of them."""
+        entries = []
+        boundary = None
+        for pk, name in videos:
+            entry = (sort_key_for(name), name, pk)
+            if len(entries) >= self.max_entries:
+                boundary = entry[0]
+                break
+            entries.append(entry)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._by_pk = {entry[2]: entry for entry in entries}
+            self._boundary = boundary
+
+    def add(self, pk, name):
+        with self._lock:
+            self._remove(pk)
+            entry = (sort_key_for(name), name, pk)
+            if self._boundary is not None and entry[0] >= self._boundary:
+                return
+            bisect.insort(self._entries, entry)
+            self._by_pk[pk] = entry
+            if len(self._entries) > self.max_entries:
+                # the last name goes back to being looked up in the database
+                last = self._entries.pop()
+                del self._by_pk[last[2]]
+                self._boundary = last[0]
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        entry = self._by_pk.pop(pk, None)
+        if entry is not None:
+            position = bisect.bisect_left(self._entries, entry)
+            del self._entries[position]
+
+    def complete(self, prefix, limit):
+        """Up to `limit` distinct names starting with `prefix`, in name order."""
+        key = sort_key_for(prefix)
+        names = []
+        with self._lock:
+            boundary = self._boundary
+            position = bisect.bisect_left(self._entries, (key,))
+            while position < len(self._entries) and len(names) < limit:
+                sort_key, name, _ = self._entries[position]
+                if boundary is not None and sort_key >= boundary:
+                    break
+                if not sort_key.startswith(key):
+                    break
+                if not names or names[-1] != name:
+                    names.append(name)
+                position += 1
+        if boundary is not None and len(names) < limit:
+            # names starting with prefix from the boundary on, if there can be any
+            start, end = max(key, boundary), _prefix_end(key)
+            if end is None or start < end:
+                names = self._complete_from_database(start, end, names, limit)
+        return names
+
+    def _complete_from_database(self, start, end, names, limit):
+        videos = Video.objects.filter(sort_key__gte=start)
+        if end is not None:
+            videos = videos.filter(sort_key__lt=end)
+        videos = videos.order_by("sort_key", "name").values_list("sort_key", "name").distinct()
+        for sort_key, name in videos[: limit - len(names)]:
+            if not names or names[-1] != name:
+                names.append(name)
+        return names
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _prefix_end(key):
+    # the first string after every one starting with key, None for no limit
+    while key and key[-1] == chr(0x10FFFF):
+        key = key[:-1]
+    if not key:
+        return None
+    return key[:-1] + chr(ord(key[-1]) + 1)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    version = collection_version()
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                index = PrefixIndex(settings.AUTOCOMPLETE_MAX_ENTRIES, version)
+                index.load(
+                    Video.objects.order_by("sort_key", "pk")
+                    .values_list("pk", "name")
+                    .iterator(chunk_size=5000)
+                )
+                _index = index
+            index = _index
+    return index
+
+
+def version_bumped(version):
+    """
+    Called with the new collection version after this process changed a
+    video and moved the version on. The change is applied to the index (or
+    is still uncommitted), so the index is current at `version` as long as it
+    was at the version before. If another process got in between, it stays
+    behind and the next lookup reloads it.
+    """
+    index = _index
+    if index is not None and version is not None:
+        with _index_lock:
+            if index.version == version - 1:
+                index.version = version
+
+
+def video_saved(pk, name):
+    if _index is not None:
+        _index.add(pk, name)
+
+
+def video_deleted(pk):
+    if _index is not None:
+        _index.remove(pk)
+
+
+def reset():
+    # drop the index, the next lookup reloads it from the database
+    global _index
+    _index = None
+
+
+def complete(prefix, limit):
+    return get_index().complete(prefix, limit)
@@ -0,0 +1,166 @@
+"""
+Benchmarks for the video collection, run with `python manage.py benchmark <name>`.
+
+Each module in this package exposes `run(rows, repeat, stdout)`. They run
+against a throwaway test database, so the real db.sqlite3 is never touched.
+A module with JSON_RESULTS = True returns its results from run() (see
+suite.py), which --json writes to a file and --baseline checks against an
+earlier run.
+"""
+
+import contextlib
+import random
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ..models import Video
+
+WORDS = [
+    "love", "night", "dance", "heart", "fire", "dream", "blue", "summer",
+    "rain", "city", "lights", "road", "home", "river", "gold", "wild",
+    "yoga", "workout", "live", "acoustic", "remix", "official", "video",
+    "session", "tour", "cover", "tutorial", "guitar", "piano", "drums",
+]
+
+# word popularity falls off like 1/rank (Zipf), as it does in real titles
+WORD_WEIGHTS = [1 / rank for rank in range(1, len(WORDS) + 1)]
+
+NAME_SUFFIXES = ["(Official Video)", "(Live)", "(Lyric Video)", "(Acoustic)", "[HD]"]
+
+# benchmarks about queries switch the response cache off, or they would
+# mostly time serving the same cached bytes
+NO_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "videos": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+ID_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+@contextlib.contextmanager
+def bench_database(name=None):
+    # in memory unless `name` gives a file, which benchmarks that care about
+    # journaling or several connections need
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    old_test_name = connection.settings_dict["TEST"]["NAME"]
+    connection.settings_dict["TEST"]["NAME"] = name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict["TEST"]["NAME"] = old_test_name
+        teardown_test_environment()
+
+
+def video_id_for(index):
+    # deterministic, unique 11 character YouTube-style ID for row `index`
+    chars = []
+    for _ in range(11):
+        index, digit = divmod(index, 64)
+        chars.append(ID_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def seed_videos(count, seed=2905, batch_size=5000):
+    """
+    Top the table up to `count` rows. Rows are generated from `seed` and their
+    index, so growing 1k -> 100k -> 1M gives the same data as seeding 1M at once.
+    """
+    start = Video.objects.count()
+    for batch_start in range(start, count, batch_size):
+        batch = []
+        for index in range(batch_start, min(batch_start + batch_size, count)):
+            rng = random.Random(seed * 1_000_003 + index)
+            video_id = video_id_for(index)
+            batch.append(
+                Video(
+                    name=_name(rng),
+                    url=f"https://www.youtube.com/watch?v={video_id}",
+                    notes=_notes(rng),
+                    video_id=video_id,
+                )
+            )
+        Video.objects.bulk_create(batch)
+
+
+def _words(rng, count):
+    return " ".join(rng.choices(WORDS, weights=WORD_WEIGHTS, k=count))
+
+
+def _name(rng):
+    # mostly short titles, often "Artist - Title", sometimes with a suffix
+    title = _words(rng, min(1 + int(rng.expovariate(0.6)), 8)).title()
+    if rng.random() < 0.6:
+        title = f"{_words(rng, rng.randint(1, 2)).title()} - {title}"
+    if rng.random() < 0.3:
+        title = f"{title} {rng.choice(NAME_SUFFIXES)}"
+    return title
+
+
+def _notes(rng):
+    # most videos have no notes, the rest a sentence or a paragraph
+    if rng.random() < 0.4:
+        return ""
+    return _words(rng, min(1 + int(rng.expovariate(1 / 12)), 120))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "p50": statistics.median(ordered),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+    }
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:8.2f} ms"
+
+
+def compare_results(results, baseline, tolerance, min_difference=0.0005):
+    """
+    Regressions in `results` against `baseline` (both nested dicts of
+    measurements), as readable lines. A p50 or p95 regresses when it's more
+    than `tolerance` (a fraction) and `min_difference` seconds slower, so noise
+    on sub-millisecond timings doesn't count; a query count when it goes up at
+    all. p99 is too noisy over a few runs to compare.
+    """
+    regressions = []
+
+    def walk(current, old, path):
+        for name, value in current.items():
+            if name not in old:
+                continue
+            where = path + [name]
+            if isinstance(value, dict):
+                walk(value, old[name], where)
+            elif name == "queries":
+                if value > old[name]:
+                    regressions.append(f"{' '.join(where)}: {old[name]} -> {value}")
+            elif name not in ("p50", "p95"):
+                continue
+            elif value > old[name] * (1 + tolerance) and value - old[name] > min_difference:
+                regressions.append(
+                    f"{' '.join(where)}: {format_ms(old[name]).strip()} -> {format_ms(value).strip()}"
+                )
+
+    walk(results, baseline, [])
+    return regressions
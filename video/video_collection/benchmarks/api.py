@@ -0,0 +1,67 @@
+"""
+Throughput of the JSON API against the HTML pages serving the same data: a
+list page, a search results page and a detail page, each VIDEO_LIST_PAGE_SIZE
+rows where there's a list. Requests go one after another through the test
+client with the response cache off, so req/s is what one worker manages.
+
+The API rows are dicts from .values(), against model instances and a
+template for the HTML, and by default leave out notes; "api +notes" asks
+for them too.
+"""
+
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import NO_CACHE, format_ms, percentiles, seed_videos, timed
+from ..models import Video
+
+DEFAULT_ROWS = [1_000, 100_000]
+
+JSON_RESULTS = True
+
+
+def _requests(pk):
+    html_list = reverse("video_list")
+    api_list = reverse("api_video_list")
+    return {
+        "list": [
+            ("html", html_list, {}),
+            ("api", api_list, {}),
+            ("api +notes", api_list, {"fields": "name,url,video_id,notes"}),
+        ],
+        "search": [
+            ("html", html_list, {"search_term": "summer rain"}),
+            ("api", api_list, {"search": "summer rain"}),
+        ],
+        "detail": [
+            ("html", reverse("video_detail", args=[pk]), {}),
+            ("api", reverse("api_video_detail", args=[pk]), {}),
+        ],
+    }
+
+
+def run(rows, repeat, stdout):
+    client = Client()
+    results = {"rows": {}}
+
+    stdout.write(
+        f"{'rows':>10} {'page':>8} {'served as':>11} {'p50':>11} {'p95':>11} {'req/s':>8}"
+    )
+    for count in rows:
+        seed_videos(count)
+        pk = Video.objects.order_by("pk").values_list("pk", flat=True)[count // 2]
+
+        measured = {}
+        with override_settings(CACHES=NO_CACHE):
+            for page, variants in _requests(pk).items():
+                for name, url, params in variants:
+                    client.get(url, params)  # warm up
+                    samples = timed(lambda: client.get(url, params), repeat)
+                    stats = {**percentiles(samples), "per_second": len(samples) / sum(samples)}
+                    measured.setdefault(page, {})[name] = stats
+                    stdout.write(
+                        f"{count:>10} {page:>8} {name:>11} {format_ms(stats['p50'])} "
+                        f"{format_ms(stats['p95'])} {stats['per_second']:>8.0f}"
+                    )
+        results["rows"][str(count)] = measured
+    return results
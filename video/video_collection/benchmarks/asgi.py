@@ -0,0 +1,116 @@
+"""
+Throughput of the sync and async views under ASGI, with 100 concurrent clients.
+
+Requests go straight into Django's ASGI application in this process (no
+server or sockets), so the numbers compare the two sets of views and not the
+network. Each client asks for a mix of list pages, searches and detail pages.
+The response cache is switched off for the run, otherwise both sets of views
+would mostly be serving the same cached bytes. --repeat is the number of
+requests per client.
+"""
+
+import asyncio
+import random
+import time
+
+from django.core.handlers.asgi import ASGIHandler
+from django.test import override_settings
+from django.urls import reverse
+
+from . import NO_CACHE, format_ms, percentiles, seed_videos
+from .. import async_views, views
+from ..models import Video
+from ..urls import urlconf_for
+
+DEFAULT_ROWS = [1_000, 100_000]
+
+CLIENTS = 100
+
+
+def request_paths(count, pks):
+    # the same mix for both runs, so they do the same work
+    rng = random.Random(2905)
+    list_url = reverse("video_list")
+    paths = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            paths.append((reverse("video_detail", args=[rng.choice(pks)]), ""))
+        elif kind < 0.8:
+            paths.append((list_url, ""))
+        else:
+            paths.append((list_url, f"search_term={rng.choice(['love', 'dance', 'live'])}"))
+    return paths
+
+
+async def get(app, path, query_string):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    sent_body = False
+    status = None
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Django listens for a disconnect until the response is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    if status != 200:
+        raise RuntimeError(f"GET {path}?{query_string} returned {status}")
+
+
+async def load(app, paths_per_client):
+    samples = []
+
+    async def client(paths):
+        for path, query_string in paths:
+            start = time.perf_counter()
+            await get(app, path, query_string)
+            samples.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(paths) for paths in paths_per_client))
+    return samples, time.perf_counter() - started
+
+
+def run(rows, repeat, stdout):
+    app = ASGIHandler()
+
+    stdout.write(
+        f"{'rows':>10} {'views':>6} {'req/s':>9} {'p50':>11} {'p95':>11} {'p99':>11}"
+    )
+    for count in rows:
+        seed_videos(count)
+        pks = list(Video.objects.order_by("?").values_list("pk", flat=True)[:1000])
+        paths = request_paths(CLIENTS * repeat, pks)
+        paths_per_client = [paths[i::CLIENTS] for i in range(CLIENTS)]
+
+        for label, page_views in (("sync", views), ("async", async_views)):
+            with override_settings(ROOT_URLCONF=urlconf_for(page_views), CACHES=NO_CACHE):
+                asyncio.run(load(app, paths_per_client[:1]))  # warm up
+                samples, elapsed = asyncio.run(load(app, paths_per_client))
+            stats = percentiles(samples)
+            stdout.write(
+                f"{count:>10} {label:>6} {len(samples) / elapsed:>9.0f} "
+                f"{format_ms(stats['p50'])} {format_ms(stats['p95'])} {format_ms(stats['p99'])}"
+            )
@@ -0,0 +1,78 @@
+"""
+CPU cost of compressing responses against the bytes it saves, for each gzip
+level and brotli quality: a video list page of VIDEO_LIST_MAX_PAGE_SIZE rows
+and the NDJSON export of the whole table, streamed chunk by chunk the way the
+middleware does it. `--rows` is the table size.
+"""
+
+import time
+
+from django.conf import settings
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import NO_CACHE, percentiles, seed_videos
+from .. import compression
+
+DEFAULT_ROWS = [10_000]
+
+GZIP_LEVELS = [1, 4, 6, 9]
+BROTLI_QUALITIES = [1, 4, 6, 9, 11]
+
+
+def cpu_timed(fn, repeat):
+    # process time, so waiting on anything else doesn't count
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        result = fn()
+        samples.append(time.process_time() - start)
+    return samples, result
+
+
+def _settings():
+    for level in GZIP_LEVELS:
+        yield f"gzip {level}", "gzip", {"VIDEO_GZIP_LEVEL": level}
+    if compression.brotli is not None:
+        for quality in BROTLI_QUALITIES:
+            yield f"br {quality}", "br", {"VIDEO_BROTLI_QUALITY": quality}
+
+
+def run(rows, repeat, stdout):
+    client = Client()
+    if compression.brotli is None:
+        stdout.write("brotli isn't installed, measuring gzip only")
+
+    stdout.write(
+        f"{'rows':>8} {'body':>7} {'encoding':>9} {'bytes':>10} {'saved':>7} "
+        f"{'cpu p50':>10} {'MB/s':>7}"
+    )
+    for count in rows:
+        seed_videos(count)
+        with override_settings(CACHES=NO_CACHE):
+            page = client.get(
+                reverse("video_list"), {"page_size": settings.VIDEO_LIST_MAX_PAGE_SIZE}
+            ).content
+            export_chunks = list(client.get(reverse("export_videos")).streaming_content)
+
+        bodies = [
+            ("page", lambda encoding: compression.compress(page, encoding), len(page)),
+            (
+                "export",
+                lambda encoding: b"".join(compression.compress_stream(export_chunks, encoding)),
+                sum(map(len, export_chunks)),
+            ),
+        ]
+        for body, compress, size in bodies:
+            stdout.write(
+                f"{count:>8} {body:>7} {'none':>9} {size:>10} {'':>7} {'':>10} {'':>7}"
+            )
+            for label, encoding, level in _settings():
+                with override_settings(**level):
+                    samples, compressed = cpu_timed(lambda: compress(encoding), repeat)
+                p50 = percentiles(samples)["p50"]
+                speed = f"{size / p50 / 1e6:7.1f}" if p50 else f"{'-':>7}"
+                stdout.write(
+                    f"{count:>8} {body:>7} {label:>9} {len(compressed):>10} "
+                    f"{1 - len(compressed) / size:>7.1%} {p50 * 1000:>7.2f} ms {speed}"
+                )
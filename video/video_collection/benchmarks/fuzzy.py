@@ -0,0 +1,31 @@
+"""
+Fuzzy (trigram) search latency against collection size, for a handful of
+misspelled queries. Seeding is slower here since every row is also indexed.
+"""
+
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import NO_CACHE, format_ms, percentiles, seed_videos, timed
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+
+TERMS = ["gutiar", "acustic sesion", "sumer rain nite", "offical remixx"]
+
+
+def run(rows, repeat, stdout):
+    client = Client()
+    url = reverse("video_list")
+
+    stdout.write(f"{'rows':>10} {'term':>18} {'p50':>11} {'p95':>11}")
+    for count in rows:
+        seed_videos(count)
+        for term in TERMS:
+            with override_settings(CACHES=NO_CACHE):
+                samples = timed(
+                    lambda: client.get(url, {"search_term": term, "fuzzy": "on"}), repeat
+                )
+            result = percentiles(samples)
+            stdout.write(
+                f"{count:>10} {term:>18} {format_ms(result['p50'])} {format_ms(result['p95'])}"
+            )
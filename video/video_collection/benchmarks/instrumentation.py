@@ -0,0 +1,62 @@
+"""
+Cost of the request timing in timing.py: the same video list and detail
+requests with the Server-Timing middleware, query timer and timed template
+backend all on, and all off. The response cache is switched off so every
+request queries and renders.
+"""
+
+import copy
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import NO_CACHE, format_ms, percentiles, seed_videos, timed
+from ..models import Video
+from ..timing import time_query
+
+DEFAULT_ROWS = [1_000, 100_000]
+
+
+def untimed_settings():
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]["BACKEND"] = "django.template.backends.django.DjangoTemplates"
+    middleware = [m for m in settings.MIDDLEWARE if not m.startswith("video_collection.timing.")]
+    return {"TEMPLATES": templates, "MIDDLEWARE": middleware}
+
+
+def measure(url, repeat):
+    # a new client each time, a client loads the middleware on first use
+    client = Client()
+    client.get(url)  # warm up
+    return timed(lambda: client.get(url), repeat)
+
+
+def run(rows, repeat, stdout):
+    connection.ensure_connection()
+
+    stdout.write(f"{'rows':>10} {'page':>7} {'timing':>7} {'p50':>11} {'p95':>11}")
+    for count in rows:
+        seed_videos(count)
+        pk = Video.objects.order_by("pk").values_list("pk", flat=True).first()
+        pages = [
+            ("list", reverse("video_list")),
+            ("detail", reverse("video_detail", args=[pk])),
+        ]
+        for page, url in pages:
+            with override_settings(CACHES=NO_CACHE):
+                on = measure(url, repeat)
+                with override_settings(**untimed_settings()):
+                    connection.execute_wrappers.remove(time_query)
+                    try:
+                        off = measure(url, repeat)
+                    finally:
+                        connection.execute_wrappers.append(time_query)
+
+            for label, samples in (("on", on), ("off", off)):
+                stats = percentiles(samples)
+                stdout.write(
+                    f"{count:>10} {page:>7} {label:>7} "
+                    f"{format_ms(stats['p50'])} {format_ms(stats['p95'])}"
+                )
@@ -0,0 +1,45 @@
+"""
+Page query latency for the first, middle and last page as the table grows.
+
+With keyset pagination every page is a LIMIT on an index range, so all three
+columns should stay roughly flat from 1k to 1M rows. The OFFSET column pages
+to the middle the old-fashioned way for comparison. All four time the same
+thing, the query for one page of video_list, without the request around it.
+"""
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from . import format_ms, percentiles, seed_videos, timed
+from ..models import Video
+from ..pagination import encode_cursor, keyset_paginate
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+
+
+def _cursor_at(position):
+    video = Video.objects.order_by("sort_key", "pk").only("sort_key")[position]
+    return encode_cursor(video.sort_key, video.pk)
+
+
+def run(rows, repeat, stdout):
+    page_size = settings.VIDEO_LIST_PAGE_SIZE
+
+    stdout.write(f"{'rows':>10} {'first':>11} {'middle':>11} {'last':>11} {'offset':>11}")
+    for count in rows:
+        seed_videos(count)
+        videos = Video.objects.all()
+        middle = _cursor_at(count // 2)
+        last = _cursor_at(count - 1)
+        paginator = Paginator(videos.order_by("sort_key", "pk"), page_size)
+
+        results = [
+            timed(lambda: keyset_paginate(videos, "sort_key", page_size), repeat),
+            timed(lambda: keyset_paginate(videos, "sort_key", page_size, after=middle), repeat),
+            timed(lambda: keyset_paginate(videos, "sort_key", page_size, before=last), repeat),
+            timed(lambda: list(paginator.page(paginator.num_pages // 2)), repeat),
+        ]
+        stdout.write(
+            f"{count:>10} "
+            + " ".join(format_ms(percentiles(r)["p50"]) for r in results)
+        )
@@ -0,0 +1,39 @@
+"""
+video_list search latency, FTS5 against the old name__icontains scan.
+
+The FTS column should grow with the number of matches on a page rather than
+with the table, while icontains has to read every row.
+"""
+
+from unittest import mock
+
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import NO_CACHE, format_ms, percentiles, seed_videos, timed
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+
+TERMS = ["guitar", "acoust", "summer rain", "tutorial piano drums"]
+
+
+def run(rows, repeat, stdout):
+    client = Client()
+    url = reverse("video_list")
+
+    stdout.write(f"{'rows':>10} {'term':>22} {'fts5':>11} {'icontains':>11}")
+    for count in rows:
+        seed_videos(count)
+        for term in TERMS:
+            # uncached, or the icontains runs would be served the FTS page
+            # cached under the same URL
+            with override_settings(CACHES=NO_CACHE):
+                fts = timed(lambda: client.get(url, {"search_term": term}), repeat)
+                with mock.patch(
+                    "video_collection.search.search_index_available", return_value=False
+                ):
+                    scan = timed(lambda: client.get(url, {"search_term": term}), repeat)
+            stdout.write(
+                f"{count:>10} {term:>22} "
+                f"{format_ms(percentiles(fts)['p50'])} {format_ms(percentiles(scan)['p50'])}"
+            )
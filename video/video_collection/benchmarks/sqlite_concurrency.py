@@ -0,0 +1,115 @@
+"""
+Read and write throughput with several threads sharing one SQLite file, with
+stock SQLite settings and then with the tuned ones (settings.SQLITE_PRAGMAS
+and the IMMEDIATE transaction mode).
+
+READERS threads load the first video list page and its count while WRITERS
+threads add videos through Video.objects.create, so each write goes through
+the same signals as the add page. Each thread does --repeat operations. Any
+"database is locked" failure is counted instead of retried.
+"""
+
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.test import override_settings
+
+from . import format_ms, percentiles, seed_videos, video_id_for
+from ..models import Video
+from ..pagination import keyset_paginate
+
+DEFAULT_ROWS = [10_000]
+
+FILE_DATABASE = True
+
+READERS = 8
+WRITERS = 4
+
+STOCK = ({"journal_mode": "delete", "synchronous": "full"}, {})
+
+
+def tuned():
+    return settings.SQLITE_PRAGMAS, {"transaction_mode": "IMMEDIATE"}
+
+
+def read():
+    videos = Video.objects.all()
+    keyset_paginate(videos, "sort_key", 50)
+    videos.count()
+
+
+def worker(operation, repeat, samples, failures, start):
+    start.wait()
+    try:
+        for _ in range(repeat):
+            began = time.perf_counter()
+            try:
+                operation()
+            except OperationalError:
+                failures.append(1)
+                continue
+            samples.append(time.perf_counter() - began)
+    finally:
+        connections.close_all()
+
+
+def measure(repeat, new_index):
+    reads, writes, failures = [], [], []
+    start = threading.Barrier(READERS + WRITERS + 1)
+
+    def write():
+        video_id = video_id_for(next(new_index))
+        Video.objects.create(
+            name=f"stress {video_id}", url=f"https://www.youtube.com/watch?v={video_id}"
+        )
+
+    threads = [
+        threading.Thread(target=worker, args=(read, repeat, reads, failures, start))
+        for _ in range(READERS)
+    ] + [
+        threading.Thread(target=worker, args=(write, repeat, writes, failures, start))
+        for _ in range(WRITERS)
+    ]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return reads, writes, len(failures), time.perf_counter() - began
+
+
+def run(rows, repeat, stdout):
+    options = connection.settings_dict["OPTIONS"]
+    original_options = dict(options)
+    new_index = itertools.count(10_000_000)
+
+    stdout.write(
+        f"{'rows':>10} {'settings':>8} {'reads/s':>9} {'read p95':>11} "
+        f"{'writes/s':>9} {'write p95':>11} {'locked':>7}"
+    )
+    try:
+        for count in rows:
+            seed_videos(count)
+            for label, (pragmas, extra_options) in (("stock", STOCK), ("tuned", tuned())):
+                # every connection is new, so the pragmas apply to all of them
+                connections.close_all()
+                options.clear()
+                options.update(original_options)
+                options.pop("transaction_mode", None)
+                options.update(extra_options)
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    reads, writes, locked, elapsed = measure(repeat, new_index)
+                    connections.close_all()
+                stdout.write(
+                    f"{count:>10} {label:>8} {len(reads) / elapsed:>9.0f} "
+                    f"{format_ms(percentiles(reads)['p95'])} "
+                    f"{len(writes) / elapsed:>9.0f} "
+                    f"{format_ms(percentiles(writes)['p95'])} {locked:>7}"
+                )
+    finally:
+        options.clear()
+        options.update(original_options)
@@ -0,0 +1,134 @@
+"""
+Every page through the test client, plus Video.save and URL parsing, as the
+table grows. For each page: p50/p95/p99 latency and the number of queries one
+request runs. The response cache is off, so every request does the work.
+
+Returns the results, so `--json results.json` saves them and
+`--baseline results.json` fails if a later run got slower or runs more
+queries. Keep the baseline from the same machine.
+"""
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import NO_CACHE, format_ms, percentiles, seed_videos, timed, video_id_for
+from .url_parsing import sample_urls
+from ..models import Video
+from ..youtube import parse_video_id
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+
+JSON_RESULTS = True
+
+# far past any seeded row, so added videos never clash with the dataset
+ADDED_ID_START = 1 << 60
+
+
+def _pages(pk):
+    list_url = reverse("video_list")
+    return {
+        "home": (reverse("home"), {}),
+        "video_list": (list_url, {}),
+        "search": (list_url, {"search_term": "summer rain"}),
+        "fuzzy_search": (list_url, {"search_term": "gutiar", "fuzzy": "on"}),
+        "video_detail": (reverse("video_detail", args=[pk]), {}),
+        "autocomplete": (reverse("autocomplete"), {"q": "da"}),
+    }
+
+
+def _measure(fn, repeat):
+    fn()  # warm up
+    # counted with an execute wrapper, as each request through the client
+    # resets connection.queries (so CaptureQueriesContext sees nothing)
+    queries = 0
+
+    def count(execute, *args):
+        nonlocal queries
+        queries += 1
+        return execute(*args)
+
+    with connection.execute_wrapper(count):
+        fn()
+    return {**percentiles(timed(fn, repeat)), "queries": queries}
+
+
+def _measure_add(client, repeat, last_seeded_pk):
+    added = iter(range(ADDED_ID_START, ADDED_ID_START + repeat + 2))
+    url = reverse("add_video")
+
+    def add():
+        video_id = video_id_for(next(added))
+        client.post(url, {"name": "New Video", "url": f"https://youtu.be/{video_id}"})
+
+    try:
+        return _measure(add, repeat)
+    finally:
+        # so the next, bigger dataset is seeded exactly as if from scratch
+        Video.objects.filter(pk__gt=last_seeded_pk).delete()
+
+
+def _measure_save(repeat, last_seeded_pk):
+    video = Video.objects.order_by("pk").first()
+    added = iter(range(ADDED_ID_START, ADDED_ID_START + repeat + 2))
+
+    def create():
+        video_id = video_id_for(next(added))
+        Video(name="New Video", url=f"https://youtu.be/{video_id}").save()
+
+    try:
+        return {
+            "create": _measure(create, repeat),
+            "update": _measure(video.save, repeat),
+        }
+    finally:
+        Video.objects.filter(pk__gt=last_seeded_pk).delete()
+
+
+def run(rows, repeat, stdout):
+    client = Client()
+    results = {"rows": {}}
+
+    stdout.write(
+        f"{'rows':>10} {'measurement':>20} {'p50':>11} {'p95':>11} {'p99':>11} {'queries':>8}"
+    )
+    for count in rows:
+        seed_videos(count)
+        last_seeded_pk = Video.objects.order_by("-pk").values_list("pk", flat=True).first()
+        pk = Video.objects.order_by("pk").values_list("pk", flat=True)[count // 2]
+
+        measured = {}
+        with override_settings(CACHES=NO_CACHE):
+            for name, (url, params) in _pages(pk).items():
+                measured[name] = _measure(lambda: client.get(url, params), repeat)
+            measured["add_video"] = _measure_add(client, repeat, last_seeded_pk)
+        measured["video_save"] = _measure_save(repeat, last_seeded_pk)
+        results["rows"][str(count)] = measured
+
+        for name, stats in _flatten(measured):
+            stdout.write(
+                f"{count:>10} {name:>20} {format_ms(stats['p50'])} "
+                f"{format_ms(stats['p95'])} {format_ms(stats['p99'])} {stats['queries']:>8}"
+            )
+
+    # per 1000 URLs, uncached and cached
+    urls = sample_urls(1000)
+    uncached = parse_video_id.__wrapped__
+    results["url_parsing"] = {
+        "uncached": percentiles(timed(lambda: [uncached(url) for url in urls], repeat)),
+        "cached": percentiles(timed(lambda: [parse_video_id(url) for url in urls], repeat)),
+    }
+    for name, stats in results["url_parsing"].items():
+        stdout.write(
+            f"{'1000 urls':>10} {name:>20} {format_ms(stats['p50'])} "
+            f"{format_ms(stats['p95'])} {format_ms(stats['p99'])}"
+        )
+    return results
+
+
+def _flatten(measured, prefix=""):
+    for name, stats in measured.items():
+        if "p50" in stats:
+            yield prefix + name, stats
+        else:
+            yield from _flatten(stats, f"{prefix}{name}.")
@@ -0,0 +1,80 @@
+"""
+Micro-benchmark of video ID extraction: the urlparse/parse_qs implementation
+Video.save used to have, the precompiled regex in youtube.py, and the regex
+with its memo cache warm. `--rows` is the number of URLs parsed per run.
+"""
+
+import time
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+
+from . import format_ms, percentiles, timed, video_id_for
+from ..youtube import parse_video_id
+
+DEFAULT_ROWS = [10_000]
+
+
+def legacy_extract(url):
+    # the old Video.save logic, for comparison
+    try:
+        url_components = parse.urlparse(url)
+        if url_components.scheme != "https" or url_components.netloc != "www.youtube.com" or url_components.path != "/watch":
+            raise ValidationError(f"Invalid YouTube URL {url}")
+        query_string = url_components.query
+        if not query_string:
+            raise ValidationError(f"Invalid YouTube URL {url}")
+        parameters = parse.parse_qs(query_string, strict_parsing=True)
+        parameter_list = parameters.get("v")
+        if not parameter_list:
+            raise ValidationError(f"Invalid YouTube URL parameters {url}")
+        return parameter_list[0]
+    except ValueError as e:
+        raise ValidationError(f"Unable to parse URL {url}") from e
+
+
+def sample_urls(count):
+    # mostly valid watch URLs with some junk, the mix the add form sees
+    urls = []
+    for index in range(count):
+        if index % 10 == 9:
+            urls.append(f"https://github.com/{index}")
+        else:
+            urls.append(f"https://www.youtube.com/watch?v={video_id_for(index)}&t={index}s")
+    return urls
+
+
+def _legacy(urls):
+    for url in urls:
+        try:
+            legacy_extract(url)
+        except ValidationError:
+            pass
+
+
+def _regex(urls):
+    uncached = parse_video_id.__wrapped__
+    for url in urls:
+        uncached(url)
+
+
+def _cached(urls):
+    for url in urls:
+        parse_video_id(url)
+
+
+def run(rows, repeat, stdout):
+    stdout.write(f"{'urls':>10} {'legacy':>11} {'regex':>11} {'cached':>11} {'per url':>14}")
+    for count in rows:
+        # repeats of as many distinct URLs as the cache holds, so the warm
+        # run is all hits
+        urls = sample_urls(min(count, parse_video_id.cache_info().maxsize))
+        urls = (urls * (count // len(urls) + 1))[:count]
+        results = [
+            percentiles(timed(lambda: _legacy(urls), repeat))["p50"],
+            percentiles(timed(lambda: _regex(urls), repeat))["p50"],
+        ]
+        _cached(urls)
+        results.append(percentiles(timed(lambda: _cached(urls), repeat))["p50"])
+        per_url = ", ".join(f"{r / count * 1e6:.2f}" for r in results)
+        stdout.write(f"{count:>10} " + " ".join(format_ms(r) for r in results) + f"  ({per_url} us)")
@@ -0,0 +1,167 @@
+"""
+Whole-response caching for the read-only pages (home, video list, detail).
+
+Every cache key includes a collection version number, and the signal
+receivers in signals.py bump it whenever a video is saved or deleted, so a
+change makes every cached page unreachable at once. Nothing has to work out
+which pages a change affected, and nothing stale is ever served. Old entries
+simply expire.
+
+The cache is the VIDEO_CACHE_ALIAS entry in settings.CACHES. A per-process
+cache (locmem) only sees version bumps made in its own process, so
+deployments with several worker processes should use the file or database
+backend.
+
+Pages read from a replica are the exception. A replica catching up doesn't
+bump the version, so a page rendered while it was behind would otherwise be
+served until the next change. Those are only kept for
+settings.VIDEO_REPLICA_CACHE_TIMEOUT seconds (see read_timeout).
+"""
+
+import functools
+import hashlib
+import threading
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+
+from .routing import read_alias
+
+VERSION_KEY = "video_collection:version"
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.VIDEO_CACHE_ALIAS]
+
+
+def collection_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # add() so two processes starting at once don't reset each other
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+async def acollection_version():
+    cache = get_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    """Move the collection version on, returning the new one (None if unknown)."""
+    cache = get_cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:  # not set yet (or evicted)
+        cache.add(VERSION_KEY, 1, timeout=None)
+        return None
+
+
+def read_timeout(timeout=DEFAULT_TIMEOUT):
+    """
+    `timeout` for something read from the primary, and no more than
+    settings.VIDEO_REPLICA_CACHE_TIMEOUT when it came from a replica.
+    """
+    if read_alias() == DEFAULT_DB_ALIAS:
+        return timeout
+    return settings.VIDEO_REPLICA_CACHE_TIMEOUT
+
+
+def cache_stats():
+    with _stats_lock:
+        return {"hits": _stats["hits"], "misses": _stats["misses"]}
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def response_key(request, version):
+    # full path includes the query string, so search terms and pages differ.
+    # pages read from the primary and the replica are kept apart, so a client
+    # pinned to the primary never gets a page rendered from a lagging replica
+    path_hash = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f"video_collection:response:{version}:{read_alias()}:{path_hash}"
+
+
+def cache_response(view):
+    """Serve GET requests from the cache, storing successful responses."""
+    if iscoroutinefunction(view):
+        return _async_cache_response(view)
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return view(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_key(request, collection_version())
+        cached = cache.get(key)
+        if cached is not None:
+            return _cached_response(cached)
+
+        _count("misses")
+        response = view(request, *args, **kwargs)
+        if _cacheable(response):
+            cache.set(key, _cache_entry(response), read_timeout(settings.VIDEO_CACHE_TIMEOUT))
+        response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
+
+
+def _async_cache_response(view):
+    # same as above with the cache's async API, which the database cache
+    # backend needs when called from an async view
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return await view(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_key(request, await acollection_version())
+        cached = await cache.aget(key)
+        if cached is not None:
+            return _cached_response(cached)
+
+        _count("misses")
+        response = await view(request, *args, **kwargs)
+        if _cacheable(response):
+            await cache.aset(
+                key, _cache_entry(response), read_timeout(settings.VIDEO_CACHE_TIMEOUT)
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def _cache_entry(response):
+    return (response.status_code, response["Content-Type"], response.content)
+
+
+def _cached_response(cached):
+    _count("hits")
+    status, content_type, content = cached
+    response = HttpResponse(content, content_type=content_type, status=status)
+    response["X-Cache"] = "HIT"
+    return response
@@ -0,0 +1,166 @@
+"""
+Response compression, brotli (if the brotli package is installed) or gzip,
+whichever the client accepts, brotli first.
+
+Streaming responses (exports, static files) are compressed chunk by chunk as
+they go out, each chunk flushed so the client gets it straight away, and the
+whole body is never held in memory. Other responses are compressed in one go
+unless they're under settings.VIDEO_COMPRESS_MIN_BYTES, where the headers
+would eat most of the saving.
+
+Responses that already have a Content-Encoding (the precompressed static
+files, see assets.py), partial content and types that are compressed already
+(images, video, archives, gzipped exports) are left alone.
+
+The levels are settings.VIDEO_GZIP_LEVEL (1-9) and VIDEO_BROTLI_QUALITY
+(0-11); `manage.py benchmark compression` shows the CPU they cost against the
+bytes they save.
+"""
+
+import zlib
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+from .assets import accepts_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ALREADY_COMPRESSED = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "application/x-brotli",
+    "application/zstd",
+    "application/pdf",
+    "application/octet-stream",
+)
+
+
+def gzip_compressor():
+    # wbits 31 makes zlib write the gzip header and trailer
+    return zlib.compressobj(settings.VIDEO_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+class GzipStream:
+
+    def __init__(self):
+        self.compressor = gzip_compressor()
+
+    def compress(self, chunk):
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=settings.VIDEO_BROTLI_QUALITY)
+
+    def compress(self, chunk):
+        return self.compressor.process(chunk) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+STREAMS = {"br": BrotliStream, "gzip": GzipStream}
+
+
+def compress(content, encoding):
+    """`content` compressed in one go with `encoding` ("br" or "gzip")."""
+    if encoding == "br":
+        return brotli.compress(content, quality=settings.VIDEO_BROTLI_QUALITY)
+    compressor = gzip_compressor()
+    return compressor.compress(content) + compressor.flush()
+
+
+def pick_encoding(request):
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    for encoding in encodings:
+        if accepts_encoding(request, encoding):
+            return encoding
+    return None
+
+
+def compress_stream(chunks, encoding):
+    stream = STREAMS[encoding]()
+    for chunk in chunks:
+        compressed = stream.compress(chunk)
+        if compressed:
+            yield compressed
+    yield stream.finish()
+
+
+async def acompress_stream(chunks, encoding):
+    stream = STREAMS[encoding]()
+    async for chunk in chunks:
+        compressed = stream.compress(chunk)
+        if compressed:
+            yield compressed
+    yield stream.finish()
+
+
+def _compressible(response):
+    if response.status_code != 200 or response.has_header("Content-Encoding"):
+        return False
+    content_type = response.get("Content-Type", "").lower()
+    return not content_type.startswith(ALREADY_COMPRESSED)
+
+
+def compress_response(request, response):
+    if not _compressible(response):
+        return response
+    # whether or not this one is compressed, the same URL can be
+    patch_vary_headers(response, ["Accept-Encoding"])
+    encoding = pick_encoding(request)
+    if encoding is None:
+        return response
+
+    if response.streaming:
+        if response.is_async:
+            response.streaming_content = acompress_stream(response.streaming_content, encoding)
+        else:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+        del response["Content-Length"]
+    else:
+        if len(response.content) < settings.VIDEO_COMPRESS_MIN_BYTES:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+
+    # the compressed body is a different set of bytes, but means the same
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response["ETag"] = "W/" + etag
+    response["Content-Encoding"] = encoding
+    return response
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request):
+            return compress_response(request, await get_response(request))
+
+        return async_middleware
+
+    def middleware(request):
+        return compress_response(request, get_response(request))
+
+    return middleware
@@ -0,0 +1,144 @@
+"""
+ETag and Last-Modified validators for the list and detail pages, for use
+with django.views.decorators.http.condition (or async_condition below for
+the async views). A client (or proxy) holding a current copy gets a 304
+before the view runs or any template is rendered.
+
+The list validators are the newest updated_at, read from the end of its
+index, and the row count, so deletes change the ETag too. They're cached
+under the collection version from cache.py, so a warm cache answers without
+any query.
+Validators read from a replica are only cached briefly, see read_timeout.
+"""
+
+import datetime
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import metrics
+from .cache import collection_version, get_cache, read_timeout
+from .hot import detail_lookup, peek
+from .models import Video
+from .routing import read_alias
+
+LAST_DELETE_KEY = "video_collection:last_delete"
+
+
+def record_deletion(when):
+    # deletes don't leave an updated_at behind, so the list's Last-Modified
+    # has to remember them separately
+    get_cache().set(LAST_DELETE_KEY, when, timeout=None)
+
+
+def collection_state():
+    cache = get_cache()
+    key = f"video_collection:state:{collection_version()}:{read_alias()}"
+    state = cache.get(key)
+    if state is None:
+        # two queries, as SQLite only answers a MAX from the index when it's
+        # alone, with COUNT(pk) alongside it reads every row
+        state = {
+            "latest": Video.objects.aggregate(latest=Max("updated_at"))["latest"],
+            "count": Video.objects.count(),
+        }
+        last_delete = cache.get(LAST_DELETE_KEY)
+        if last_delete and (state["latest"] is None or last_delete > state["latest"]):
+            state["latest"] = last_delete
+        cache.set(key, state, read_timeout())
+        if read_alias() == DEFAULT_DB_ALIAS:
+            # while it's to hand, for the metrics page (a replica may be behind)
+            metrics.set_video_count(state["count"])
+    return state
+
+
+def list_etag(request, *args, **kwargs):
+    state = collection_state()
+    latest = state["latest"].timestamp() if state["latest"] else 0
+    return f"list-{state['count']}-{latest}"
+
+
+def list_last_modified(request, *args, **kwargs):
+    return collection_state()["latest"]
+
+
+def _video_updated_at(field, value):
+    video = peek(field, value)
+    if video is not None:  # in memory, see hot.py
+        return video.updated_at
+    cache = get_cache()
+    key = f"video_collection:updated:{collection_version()}:{read_alias()}:{field}:{value}"
+    updated_at = cache.get(key)
+    if updated_at is None:
+        updated_at = (
+            Video.objects.filter(**{field: value}).values_list("updated_at", flat=True).first()
+        )
+        # False records "no such video", so a 404 doesn't query twice
+        cache.set(key, updated_at or False, read_timeout())
+    return updated_at or None
+
+
+# the detail page is reached by pk or by YouTube video ID
+
+
+def detail_etag(request, video_pk=None, video_id=None):
+    field, value = detail_lookup(video_pk, video_id)
+    updated_at = _video_updated_at(field, value)
+    # None lets the view run and raise its 404
+    if updated_at is None:
+        return None
+    return f"video-{value}-{updated_at.timestamp()}"
+
+
+def detail_last_modified(request, video_pk=None, video_id=None):
+    return _video_updated_at(*detail_lookup(video_pk, video_id))
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """
+    condition() for async views. Django's version calls the validators on the
+    event loop, where a cache miss would query the database synchronously, so
+    here they both run in one sync_to_async call.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            def validators():
+                etag = etag_func(request, *args, **kwargs) if etag_func else None
+                last_modified = (
+                    last_modified_func(request, *args, **kwargs)
+                    if last_modified_func
+                    else None
+                )
+                return etag, last_modified
+
+            etag, last_modified = await sync_to_async(validators)()
+            if etag is not None:
+                etag = quote_etag(etag)
+            if last_modified:
+                if not timezone.is_aware(last_modified):
+                    last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)
+                last_modified = int(last_modified.timestamp())
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+
+        return wrapper
+
+    return decorator
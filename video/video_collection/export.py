@@ -0,0 +1,68 @@
+"""
+Streaming export of the whole collection as NDJSON or CSV, optionally gzipped.
+
+Everything here is a generator: rows come from the database a chunk at a
+time and go out as soon as they're encoded, so memory use doesn't depend on
+the size of the collection. The CSV columns include the name, url and notes
+that the import_videos command reads, so an export can be imported again.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+FIELDS = ["id", "name", "url", "notes", "video_id"]
+
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def export_rows(queryset, chunk_size):
+    # values() skips building model instances, iterator() skips the result cache
+    return queryset.order_by("pk").values(*FIELDS).iterator(chunk_size=chunk_size)
+
+
+def ndjson_chunks(rows, chunk_size):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False))
+        lines.append("\n")
+        if len(lines) >= chunk_size * 2:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def csv_chunks(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for number, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if number % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+ENCODERS = {"csv": csv_chunks, "ndjson": ndjson_chunks}
+
+
+def gzip_chunks(chunks, level=6):
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_videos(queryset, export_format, compress=False, chunk_size=2000):
+    """Yield the encoded export, bytes if `compress` is True, otherwise str."""
+    chunks = ENCODERS[export_format](export_rows(queryset, chunk_size), chunk_size)
+    if compress:
+        return gzip_chunks(chunks)
+    return chunks
@@ -1,5 +1,13 @@
 from django import forms
+from django.conf import settings
 from .models import Video
+from .search import (
+    afuzzy_search_videos,
+    asearch_videos,
+    fuzzy_search_videos,
+    search_videos,
+)
+from .youtube import parse_video_id
 
 
 class VideoForm(forms.ModelForm):
@@ -7,6 +15,51 @@ class VideoForm(forms.ModelForm):
         model = Video
         fields = ["name", "url", "notes"]
 
+    def clean_url(self):
+        # checked here so a bad or duplicate URL is a field error, rather than
+        # Video.save raising and the insert failing. the model's own checks
+        # only catch what slips past (e.g. two people adding at once)
+        url = self.cleaned_data["url"]
+        video_id = parse_video_id(url)
+        if video_id is None:
+            raise forms.ValidationError("Invalid YouTube URL", code="invalid_youtube_url")
+        # an edit keeping the same video isn't a duplicate of itself
+        if Video.objects.filter(video_id=video_id).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("You already added that video", code="duplicate")
+        return url
+
 
 class SearchForm(forms.Form):
-    search_term = forms.CharField()
+    search_term = forms.CharField(
+        widget=forms.TextInput(
+            attrs={"list": "search-suggestions", "autocomplete": "off"}
+        )
+    )
+    fuzzy = forms.BooleanField(required=False, label="Match misspellings")
+
+    def search(self, videos):
+        # ranked full-text search over name and notes, see search.py.
+        # returns the matching videos and the field to order them by
+        return search_videos(videos, self.cleaned_data["search_term"])
+
+    def fuzzy_search(self, videos):
+        # best matches for a possibly misspelled name, as a list
+        return fuzzy_search_videos(
+            videos,
+            self.cleaned_data["search_term"],
+            settings.FUZZY_SEARCH_LIMIT,
+            settings.FUZZY_SEARCH_THRESHOLD,
+        )
+
+    # the same for the async views
+
+    async def asearch(self, videos):
+        return await asearch_videos(videos, self.cleaned_data["search_term"])
+
+    async def afuzzy_search(self, videos):
+        return await afuzzy_search_videos(
+            videos,
+            self.cleaned_data["search_term"],
+            settings.FUZZY_SEARCH_LIMIT,
+            settings.FUZZY_SEARCH_THRESHOLD,
+        )
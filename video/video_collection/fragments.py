@@ -0,0 +1,63 @@
+"""
+Bounded LRU cache of rendered video list rows.
+
+Rows are keyed by (pk, updated_at), so an edited video simply gets a new key
+and its old fragment ages out, with no invalidation needed. Rendering a long
+list then only runs the row template for rows that are new or changed.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class LRUCache:
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The value stored under `key`, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """Remove `key`, returning its value (or None)."""
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def get_or_render(self, key, render):
+        fragment = self.get(key)
+        if fragment is None:
+            # render outside the lock, two threads racing on a key both render it
+            fragment = render()
+            self.set(key, fragment)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+row_cache = LRUCache(settings.VIDEO_ROW_CACHE_SIZE)
@@ -0,0 +1,102 @@
+"""
+Per-process LRU of recently requested Video objects, so the detail page of a
+popular video, by pk or by YouTube ID (/v/<video_id>), doesn't query the
+database at all.
+
+Each video is stored under both its pk and its video ID, so either route
+warms the cache for the other. Receivers in signals.py drop a video as soon
+as it's saved or deleted, and everything after bulk changes. Other processes
+don't hear about those, so entries also remember the collection version
+(see cache.py) they were loaded under and are ignored once it has moved on.
+That also catches a request that loaded a video just before a change landed.
+Videos read from a replica, which may be behind, also expire after
+settings.VIDEO_REPLICA_CACHE_TIMEOUT seconds, as its catching up doesn't move
+the version on.
+
+The objects are shared between requests, so treat them as read-only.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache import acollection_version, collection_version
+from .fragments import LRUCache
+from .models import Video
+from .routing import read_alias
+
+# two entries per video, one per lookup
+hot_videos = LRUCache(2 * settings.VIDEO_HOT_CACHE_SIZE)
+
+
+def detail_lookup(video_pk=None, video_id=None):
+    """(field, value) for the detail page's URL kwargs, one or the other."""
+    if video_id is None:
+        return "pk", video_pk
+    return "video_id", video_id
+
+
+def _cached(field, value, version):
+    entry = hot_videos.get((read_alias(), field, value))
+    if entry is None or entry[0] != version:
+        return None
+    if entry[2] is not None and entry[2] < time.monotonic():
+        return None
+    return entry[1]
+
+
+def _store(video, version):
+    alias = read_alias()
+    expires = None
+    if alias != DEFAULT_DB_ALIAS:
+        expires = time.monotonic() + settings.VIDEO_REPLICA_CACHE_TIMEOUT
+    entry = (version, video, expires)
+    hot_videos.set((alias, "pk", video.pk), entry)
+    hot_videos.set((alias, "video_id", video.video_id), entry)
+
+
+def peek(field, value):
+    """The video if it's in memory and current, without loading it."""
+    return _cached(field, value, collection_version())
+
+
+def get_video(field, value):
+    """The video whose `field` ("pk" or "video_id") is `value`, or None."""
+    # the version is read before loading, so if a change lands in between
+    # the entry is already out of date
+    version = collection_version()
+    video = _cached(field, value, version)
+    if video is None:
+        try:
+            video = Video.objects.get(**{field: value})
+        except Video.DoesNotExist:
+            return None
+        _store(video, version)
+    return video
+
+
+async def aget_video(field, value):
+    """Async version of get_video, for the async views."""
+    version = await acollection_version()
+    video = _cached(field, value, version)
+    if video is None:
+        try:
+            video = await Video.objects.aget(**{field: value})
+        except Video.DoesNotExist:
+            return None
+        _store(video, version)
+    return video
+
+
+def forget(video):
+    """Drop `video`, as read from any database."""
+    for alias in connections:
+        entry = hot_videos.pop((alias, "pk", video.pk))
+        hot_videos.pop((alias, "video_id", video.video_id))
+        if entry is not None:  # under its old video ID, if the URL changed
+            hot_videos.pop((alias, "video_id", entry[1].video_id))
+
+
+def clear():
+    hot_videos.clear()
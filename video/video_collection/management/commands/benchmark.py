@@ -0,0 +1,81 @@
+import importlib
+import json
+import pkgutil
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from video_collection import benchmarks
+from video_collection.benchmarks import bench_database, compare_results
+
+
+def available_benchmarks():
+    return sorted(module.name for module in pkgutil.iter_modules(benchmarks.__path__))
+
+
+class Command(BaseCommand):
+    help = "Run one of the video_collection benchmarks against a throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help=f"one of: {', '.join(available_benchmarks())}")
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            help="table sizes to measure at (defaults depend on the benchmark)",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="timed runs per measurement"
+        )
+        parser.add_argument("--json", help="write the results to this file")
+        parser.add_argument(
+            "--baseline", help="fail if the results are worse than this earlier --json file"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="fraction slower than the baseline allowed before failing (default 0.25)",
+        )
+
+    def handle(self, *args, **options):
+        name = options["name"]
+        if name not in available_benchmarks():
+            raise CommandError(
+                f"Unknown benchmark {name!r}, choose from {', '.join(available_benchmarks())}"
+            )
+        module = importlib.import_module(f"video_collection.benchmarks.{name}")
+        rows = options["rows"] or module.DEFAULT_ROWS
+
+        if (options["json"] or options["baseline"]) and not getattr(module, "JSON_RESULTS", False):
+            raise CommandError(f"The {name} benchmark doesn't report results as JSON")
+
+        # read it first, so a bad path fails before a long run
+        baseline = None
+        if options["baseline"]:
+            try:
+                baseline = json.loads(Path(options["baseline"]).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read baseline {options['baseline']}: {e}")
+
+        # benchmarks about locking and journaling need a real file
+        if getattr(module, "FILE_DATABASE", False):
+            with tempfile.TemporaryDirectory() as tmp:
+                with bench_database(str(Path(tmp) / "bench.sqlite3")):
+                    results = module.run(rows, options["repeat"], self.stdout)
+        else:
+            with bench_database():
+                results = module.run(rows, options["repeat"], self.stdout)
+
+        if options["json"]:
+            Path(options["json"]).write_text(json.dumps(results, indent=2) + "\n")
+
+        if baseline is not None:
+            regressions = compare_results(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regression(s) against {options['baseline']}:\n  "
+                    + "\n  ".join(regressions)
+                )
+            self.stdout.write(f"No regressions against {options['baseline']}")
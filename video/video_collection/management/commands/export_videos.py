@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from video_collection.export import ENCODERS, export_videos
+from video_collection.models import Video
+
+
+class Command(BaseCommand):
+    help = "Stream every video out as CSV or NDJSON, optionally gzip compressed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="file to write, - for stdout")
+        parser.add_argument("--format", choices=sorted(ENCODERS), default="ndjson")
+        parser.add_argument("--gzip", action="store_true", help="gzip the output")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunks = export_videos(
+            Video.objects.all(),
+            options["format"],
+            compress=options["gzip"],
+            chunk_size=options["chunk_size"],
+        )
+
+        if options["path"] == "-":
+            if options["gzip"]:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+            else:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending="")
+            return
+
+        if options["gzip"]:
+            out = open(options["path"], "wb")
+        else:
+            out = open(options["path"], "w", encoding="utf-8", newline="")
+        with out:
+            for chunk in chunks:
+                out.write(chunk)
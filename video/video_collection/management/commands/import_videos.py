@@ -0,0 +1,173 @@
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from video_collection.models import Video
+from video_collection.youtube import extract_video_id
+
+NAME_MAX_LENGTH = Video._meta.get_field("name").max_length
+URL_MAX_LENGTH = Video._meta.get_field("url").max_length
+
+
+def read_csv(stream):
+    # header row with name, url and (optionally) notes columns
+    for number, row in enumerate(csv.DictReader(stream), start=1):
+        yield number, row
+
+
+def read_ndjson(stream):
+    number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = e
+        if not isinstance(row, (dict, ValueError)):
+            row = ValueError("expected a JSON object")
+        yield number, row
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def _text(row, field):
+    # NDJSON values can be numbers, lists or objects as well as strings
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValidationError(f"{field.capitalize()} must be a string, not {type(value).__name__}")
+    return value
+
+
+def build_video(row):
+    """Validate one input row the same way the add form and Video.save would."""
+    if isinstance(row, ValueError):
+        raise ValidationError(f"Unreadable row: {row}")
+    name = _text(row, "name").strip()
+    url = _text(row, "url").strip()
+    notes = _text(row, "notes")
+    if not name:
+        raise ValidationError("Missing name")
+    if len(name) > NAME_MAX_LENGTH:
+        raise ValidationError(f"Name longer than {NAME_MAX_LENGTH} characters")
+    if not url:
+        raise ValidationError("Missing URL")
+    if len(url) > URL_MAX_LENGTH:
+        raise ValidationError(f"URL longer than {URL_MAX_LENGTH} characters")
+    return Video(name=name, url=url, notes=notes, video_id=extract_video_id(url))
+
+
+class Command(BaseCommand):
+    help = "Import videos from a CSV or NDJSON file (or stdin) with name, url and notes fields"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="file to read, - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="input format, guessed from the file extension if not given",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--checkpoint",
+            help="file recording how far the import got; an interrupted import "
+            "run again with the same checkpoint carries on from there",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"] or self.guess_format(path)
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        done = int(checkpoint.read_text()) if checkpoint and checkpoint.exists() else 0
+        if done:
+            self.stdout.write(f"Resuming after record {done}")
+
+        self.imported = self.duplicates = self.errors = 0
+        started = time.perf_counter()
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            batch = []
+            for number, row in READERS[input_format](stream):
+                if number <= done:
+                    continue
+                batch.append((number, row))
+                if len(batch) >= options["batch_size"]:
+                    self.import_batch(batch, checkpoint)
+                    batch = []
+            if batch:
+                self.import_batch(batch, checkpoint)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if checkpoint and checkpoint.exists():
+            checkpoint.unlink()
+
+        elapsed = time.perf_counter() - started
+        rate = self.imported / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.imported} videos in {elapsed:.1f}s ({rate:.0f}/s), "
+                f"skipped {self.duplicates} duplicates and {self.errors} invalid rows"
+            )
+        )
+
+    def guess_format(self, path):
+        suffix = Path(path).suffix.lower()
+        if suffix == ".csv":
+            return "csv"
+        if suffix in (".ndjson", ".jsonl"):
+            return "ndjson"
+        raise CommandError("Can't tell the input format, pass --format csv or --format ndjson")
+
+    def import_batch(self, batch, checkpoint):
+        videos = {}
+        for number, row in batch:
+            try:
+                video = build_video(row)
+            except ValidationError as e:
+                self.errors += 1
+                self.stderr.write(f"record {number}: {'; '.join(e.messages)}")
+                continue
+            if video.video_id in videos:
+                self.duplicates += 1
+                continue
+            videos[video.video_id] = video
+
+        while True:
+            # one indexed lookup per batch instead of an IntegrityError per duplicate
+            existing = set(
+                Video.objects.filter(video_id__in=list(videos)).values_list("video_id", flat=True)
+            )
+            new_videos = [video for video_id, video in videos.items() if video_id not in existing]
+            try:
+                with transaction.atomic():
+                    Video.objects.bulk_import(new_videos)
+            except IntegrityError:
+                # another process added some of these since the lookup, try
+                # again against what's there now
+                for video in new_videos:
+                    video.pk = None
+                    video._state.adding = True
+                continue
+            break
+        self.duplicates += len(existing)
+        self.imported += len(new_videos)
+
+        if checkpoint:
+            # written once the batch is committed, and swapped in atomically
+            tmp = checkpoint.with_name(checkpoint.name + ".tmp")
+            tmp.write_text(str(batch[-1][0]))
+            os.replace(tmp, checkpoint)
@@ -0,0 +1,295 @@
+import http.client
+import itertools
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from video_collection.benchmarks import ID_ALPHABET, WORDS, percentiles
+
+DEFAULT_MIX = "home=1,list=4,search=2,detail=4,add=1"
+
+KINDS = ("home", "list", "search", "detail", "add")
+
+DETAIL_LINK = re.compile(r'href="/video_detail/(\d+)"')
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CSRF_COOKIE = re.compile(r"csrftoken=([^;]+)")
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise CommandError(f"Unknown request kind {kind!r}, choose from {', '.join(KINDS)}")
+        try:
+            weights[kind] = float(weight)
+        except ValueError:
+            raise CommandError(f"Weight for {kind} must be a number, not {weight!r}")
+    if not any(weight > 0 for weight in weights.values()):
+        raise CommandError("The mix needs at least one request kind with a weight above 0")
+    return weights
+
+
+class MissingCSRFToken(http.client.HTTPException):
+    pass
+
+
+class Session:
+    """One keep-alive connection to the server, for one worker thread."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        )
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.prefix = parts.path.rstrip("/")
+        self.host = parts.netloc
+        self.csrf = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = {"Host": self.host, **(headers or {})}
+        try:
+            self.connection.request(method, self.prefix + path, body, headers)
+            response = self.connection.getresponse()
+            return response.status, response.getheaders(), response.read()
+        except (OSError, http.client.HTTPException):
+            # the next request reconnects
+            self.connection.close()
+            raise
+
+    def csrf_token(self):
+        # the add form's token and the cookie it goes with, fetched once
+        if self.csrf is None:
+            _, headers, body = self.request("GET", "/add")
+            cookies = " ".join(value for name, value in headers if name.lower() == "set-cookie")
+            cookie = CSRF_COOKIE.search(cookies)
+            token = CSRF_INPUT.search(body.decode(errors="replace"))
+            if cookie is None or token is None:
+                raise MissingCSRFToken("no CSRF token on the add page")
+            self.csrf = (cookie.group(1), token.group(1))
+        return self.csrf
+
+
+class LoadTest:
+
+    def __init__(self, base_url, weights, timeout, seed):
+        self.base_url = base_url
+        self.kinds = list(weights)
+        self.weights = [weights[kind] for kind in self.kinds]
+        self.timeout = timeout
+        self.seed = seed
+        self.pks = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.added = 0
+        self.worker_numbers = itertools.count()
+
+    def prepare(self):
+        """Find some video pks for detail requests from the first list page."""
+        session = Session(self.base_url, self.timeout)
+        try:
+            status, _, body = session.request("GET", "/video_list")
+        except (OSError, http.client.HTTPException) as e:
+            raise CommandError(f"Can't reach {self.base_url}: {e}")
+        if status != 200:
+            raise CommandError(f"{self.base_url}/video_list returned {status}")
+        self.pks = sorted(set(DETAIL_LINK.findall(body.decode(errors="replace"))))
+        if not self.pks and "detail" in self.kinds:
+            index = self.kinds.index("detail")
+            del self.kinds[index], self.weights[index]
+            if not any(self.weights):
+                raise CommandError("No videos to request details of, add some first")
+            return "No videos on the list page, skipping detail requests"
+
+    def session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = Session(self.base_url, self.timeout)
+        return session
+
+    def rng(self):
+        # one generator per worker thread, each seeded from the seed and the
+        # worker's number
+        rng = getattr(self.local, "rng", None)
+        if rng is None:
+            with self.lock:
+                number = next(self.worker_numbers)
+            rng = self.local.rng = random.Random(f"{self.seed}-{number}")
+        return rng
+
+    def pick(self, rng):
+        return rng.choices(self.kinds, weights=self.weights)[0]
+
+    def send(self, kind):
+        session, rng = self.session(), self.rng()
+        if kind == "home":
+            return session.request("GET", "/")[0], 200
+        if kind == "list":
+            return session.request("GET", "/video_list")[0], 200
+        if kind == "search":
+            query = urlencode({"search_term": rng.choice(WORDS)})
+            return session.request("GET", f"/video_list?{query}")[0], 200
+        if kind == "detail":
+            return session.request("GET", f"/video_detail/{rng.choice(self.pks)}")[0], 200
+        cookie, token = session.csrf_token()
+        video_id = "".join(rng.choices(ID_ALPHABET, k=11))
+        body = urlencode({
+            "csrfmiddlewaretoken": token,
+            "name": f"Load test {video_id}",
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+        })
+        status = session.request(
+            "POST",
+            "/add",
+            body,
+            {
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Cookie": f"csrftoken={cookie}",
+                "Referer": f"{self.base_url}/add",
+            },
+        )[0]
+        return status, 302  # redirected to the list once added
+
+    def timed_send(self, kind, started):
+        # `started` is when the request was due, so in open loop mode time
+        # spent waiting for a free worker counts against the server
+        try:
+            status, expected = self.send(kind)
+            error = None if status == expected else f"HTTP {status}"
+        except (OSError, http.client.HTTPException) as e:
+            error = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies[kind].append(elapsed)
+            if error:
+                self.errors[(kind, error)] += 1
+            elif kind == "add":
+                self.added += 1
+
+    def closed_loop(self, workers, duration):
+        # each worker sends its next request as soon as the last one is back
+        deadline = time.perf_counter() + duration
+
+        def worker():
+            rng = self.rng()
+            while time.perf_counter() < deadline:
+                self.timed_send(self.pick(rng), time.perf_counter())
+
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(worker) for _ in range(workers)]
+        for future in futures:
+            future.result()  # re-raises anything a worker didn't expect
+
+    def open_loop(self, workers, duration, rate):
+        # requests arrive at `rate` per second (Poisson), however slow the
+        # server gets, which is what shows where it saturates
+        rng = random.Random(self.seed)
+        start = time.perf_counter()
+        due = start
+        futures = []
+        with ThreadPoolExecutor(workers) as pool:
+            while True:
+                due += rng.expovariate(rate)
+                if due - start >= duration:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self.timed_send, self.pick(rng), due))
+        for future in futures:
+            future.result()
+
+
+class Command(BaseCommand):
+    help = "Send a mix of requests to a running server and report throughput and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", default="http://127.0.0.1:8000", help="where the app is served"
+        )
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help=f"relative weights of {', '.join(KINDS)} requests (default {DEFAULT_MIX})",
+        )
+        parser.add_argument("--duration", type=float, default=10, help="seconds to run for")
+        parser.add_argument(
+            "--workers", type=int, default=8, help="threads sending requests (default 8)"
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            help="open loop: requests per second to send regardless of how fast "
+            "responses come back. Without it each worker waits for its last response",
+        )
+        parser.add_argument("--timeout", type=float, default=30, help="per request, in seconds")
+        parser.add_argument("--seed", type=int, default=2905)
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options["rate"] is not None and options["rate"] <= 0:
+            raise CommandError("--rate must be above 0")
+
+        load = LoadTest(
+            options["url"].rstrip("/"),
+            parse_mix(options["mix"]),
+            options["timeout"],
+            options["seed"],
+        )
+        warning = load.prepare()
+        if warning:
+            self.stderr.write(warning)
+
+        started = time.perf_counter()
+        if options["rate"] is None:
+            load.closed_loop(options["workers"], options["duration"])
+        else:
+            load.open_loop(options["workers"], options["duration"], options["rate"])
+        elapsed = time.perf_counter() - started
+
+        self.report(load, elapsed, options)
+
+    def report(self, load, elapsed, options):
+        mode = (
+            f"open loop at {options['rate']:g} req/s"
+            if options["rate"] is not None
+            else f"closed loop, {options['workers']} workers"
+        )
+        total = sum(len(samples) for samples in load.latencies.values())
+        errors = sum(load.errors.values())
+        self.stdout.write(f"{options['url']}, {mode}, {elapsed:.1f} s")
+        self.stdout.write(
+            f"{total} requests, {total / elapsed:.1f} req/s, "
+            f"{errors} errors ({errors / total if total else 0:.1%}), {load.added} videos added"
+        )
+        self.stdout.write(
+            f"{'kind':>8} {'count':>7} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+        )
+        rows = [(kind, load.latencies[kind]) for kind in KINDS if load.latencies[kind]]
+        rows.append(("all", [s for samples in load.latencies.values() for s in samples]))
+        for kind, samples in rows:
+            if not samples:
+                continue
+            stats = percentiles(samples)
+            if kind == "all":
+                kind_errors = errors
+            else:
+                kind_errors = sum(n for (k, _), n in load.errors.items() if k == kind)
+            timings = (stats["p50"], stats["p95"], stats["p99"], max(samples))
+            self.stdout.write(
+                f"{kind:>8} {len(samples):>7} {kind_errors:>7} "
+                + " ".join(f"{value * 1000:7.1f}ms" for value in timings)
+            )
+        for (kind, error), count in sorted(load.errors.items()):
+            self.stderr.write(f"{kind}: {count} x {error}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from video_collection.cache import bump_version
+from video_collection.search import rebuild_fts_index
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search index, triggers included, from the videos table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if not rebuild_fts_index(connections[options["database"]]):
+            raise CommandError(
+                "SQLite FTS5 isn't available for this database, search will use icontains"
+            )
+        # cached search results came from the old index
+        bump_version()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,388 @@
+"""
+Counters and histograms for the /metrics page, in the Prometheus text format.
+
+Each process keeps its own numbers in memory: request counts, latency,
+query counts and response cache hits and misses per URL name (fed by the
+timing middleware, see timing.py), search hits and misses (see
+count_searches), and failed adds by reason. With several worker
+processes, set settings.VIDEO_METRICS_DIR to a directory they share. Each
+process then writes its numbers to <pid>-<random>.json there at most every
+VIDEO_METRICS_FLUSH_SECONDS, and a scrape adds up every file, so it doesn't
+matter which worker answers it. Files of exited workers are kept, so their
+counts don't vanish from the totals, and the random part keeps a new process
+that gets an old one's PID from writing over its file.
+
+The video count comes from the cache (see VIDEO_COUNT_KEY), kept up to date
+by signals.py, so a scrape never counts the table. It is missing from the
+output until something has counted the videos (see conditional.py), and
+again after a bulk_create that skipped conflicting rows.
+"""
+
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+from .cache import (
+    acollection_version,
+    collection_version,
+    get_cache,
+    read_timeout,
+    response_key,
+)
+
+VIDEO_COUNT_KEY = "video_collection:video_count"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS = {
+    "video_requests_total": ("counter", "Requests served, by URL name and status code."),
+    "video_request_duration_seconds": ("histogram", "Time spent serving requests, by URL name."),
+    "video_db_queries_total": ("counter", "Database queries run, by URL name."),
+    "video_response_cache_total": (
+        "counter",
+        "Pages looked up in the response cache, by URL name and whether it had them.",
+    ),
+    "video_searches_total": ("counter", "Video list searches, by whether anything matched."),
+    "video_add_failures_total": ("counter", "Videos not added, by reason."),
+    "video_collection_videos": ("gauge", "Videos in the collection."),
+}
+
+
+class Histogram:
+    """Counts of observations at or below each bucket bound, plus +Inf."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative, running = {}, 0
+        for bound, bucket in zip([*self.bounds, float("inf")], counts):
+            running += bucket
+            cumulative[bound] = running
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+
+class Registry:
+    """This process's counters and histograms, keyed by (name, labels)."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name, bounds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(bounds))
+        return histogram
+
+    def samples(self):
+        """Everything recorded so far, as JSON-friendly lists."""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+        return {
+            "counters": [[name, dict(labels), value] for (name, labels), value in counters],
+            "histograms": [
+                [name, dict(labels), _histogram_sample(histogram)]
+                for (name, labels), histogram in histograms
+            ],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _histogram_sample(histogram):
+    snapshot = histogram.snapshot()
+    return {
+        "bounds": list(histogram.bounds),
+        "buckets": list(snapshot["buckets"].values()),
+        "count": snapshot["count"],
+        "sum": snapshot["sum"],
+    }
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+    maybe_flush()
+
+
+def observe_request(url_name, status, seconds, query_count, cache_result=None):
+    """
+    Record a finished request. `cache_result` is "hit" or "miss" for pages
+    that went through the response cache (see cache.py), None for the rest.
+    """
+    bounds = [bound / 1000 for bound in settings.VIDEO_TIMING_BUCKETS_MS]
+    registry.histogram("video_request_duration_seconds", bounds, view=url_name).observe(seconds)
+    registry.inc("video_requests_total", view=url_name, status=str(status))
+    registry.inc("video_db_queries_total", query_count, view=url_name)
+    if cache_result is not None:
+        registry.inc("video_response_cache_total", view=url_name, result=cache_result)
+    maybe_flush()
+
+
+def record_search(request, found):
+    """Called by a search view with how many videos matched, see count_searches."""
+    request.search_result = "hit" if found else "miss"
+
+
+def count_searches(param):
+    """
+    Count searches (requests with a non-blank `param`) in video_searches_total,
+    whether the view runs or not. Goes outside condition() and cache_response,
+    which answer repeated searches with a 304 or a cached page without calling
+    the view, so record_search never hears about them. Each result the view
+    records is kept in the cache next to the cached page, and those requests
+    are counted from there.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not request.GET.get(param, "").strip():
+                    return await view(request, *args, **kwargs)
+                key = _search_result_key(request, await acollection_version())
+                response = await view(request, *args, **kwargs)
+                result = getattr(request, "search_result", None)
+                if result is not None:
+                    await get_cache().aset(key, result, read_timeout(None))
+                else:
+                    result = await get_cache().aget(key)
+                _count_search_result(result)
+                return response
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.GET.get(param, "").strip():
+                return view(request, *args, **kwargs)
+            key = _search_result_key(request, collection_version())
+            response = view(request, *args, **kwargs)
+            result = getattr(request, "search_result", None)
+            if result is not None:
+                # no timeout, a 304 can come long after the page was cached.
+                # a new version makes it unreachable, and the backend culls it
+                get_cache().set(key, result, read_timeout(None))
+            else:
+                result = get_cache().get(key)
+            _count_search_result(result)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _search_result_key(request, version):
+    return f"{response_key(request, version)}:search"
+
+
+def _count_search_result(result):
+    # None when the view didn't search (a bad cursor, a page the API doesn't
+    # count) or the result was culled
+    if result is not None:
+        inc("video_searches_total", result=result)
+
+
+def request_histograms():
+    """Request time histograms (seconds) for this process, by URL name."""
+    return {
+        labels["view"]: {
+            "buckets": dict(zip([*sample["bounds"], float("inf")], sample["buckets"])),
+            "count": sample["count"],
+            "sum": sample["sum"],
+        }
+        for name, labels, sample in sorted(
+            registry.samples()["histograms"], key=lambda item: item[1]["view"]
+        )
+        if name == "video_request_duration_seconds"
+    }
+
+
+# --- sharing between processes
+
+
+def maybe_flush():
+    if not settings.VIDEO_METRICS_DIR:
+        return
+    if time.monotonic() - registry.flushed_at >= settings.VIDEO_METRICS_FLUSH_SECONDS:
+        flush()
+
+
+def flush():
+    """Write this process's numbers to its file in VIDEO_METRICS_DIR."""
+    registry.flushed_at = time.monotonic()
+    directory = Path(settings.VIDEO_METRICS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    # written beside the real file and renamed over it, so a scrape never
+    # reads half a file
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, prefix=".tmp-", suffix=".json", delete=False
+    ) as tmp:
+        json.dump(registry.samples(), tmp)
+    os.replace(tmp.name, directory / _file_name())
+
+
+_file = (None, None)  # (pid, file name)
+
+
+def _file_name():
+    # made again in a forked child, which mustn't share its parent's file
+    global _file
+    pid = os.getpid()
+    if _file[0] != pid:
+        _file = (pid, f"{pid}-{uuid.uuid4().hex}.json")
+    return _file[1]
+
+
+def collect():
+    """Samples from every process (just this one without VIDEO_METRICS_DIR)."""
+    if not settings.VIDEO_METRICS_DIR:
+        return registry.samples()
+
+    flush()
+    counters, histograms = {}, {}
+    for path in Path(settings.VIDEO_METRICS_DIR).glob("[0-9]*.json"):
+        try:
+            samples = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # a worker's file being replaced, it'll be there next time
+        for name, labels, value in samples["counters"]:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, sample in samples["histograms"]:
+            key = (name, tuple(sorted(labels.items())))
+            merged = histograms.get(key)
+            if merged is None or merged["bounds"] != sample["bounds"]:
+                # bounds only differ when settings changed between restarts
+                histograms[key] = merged = {
+                    "bounds": sample["bounds"],
+                    "buckets": [0] * len(sample["buckets"]),
+                    "count": 0,
+                    "sum": 0.0,
+                }
+            merged["buckets"] = [a + b for a, b in zip(merged["buckets"], sample["buckets"])]
+            merged["count"] += sample["count"]
+            merged["sum"] += sample["sum"]
+    return {
+        "counters": [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [
+            [name, dict(labels), sample] for (name, labels), sample in histograms.items()
+        ],
+    }
+
+
+# --- video count, kept in the shared cache
+
+
+def video_count():
+    return get_cache().get(VIDEO_COUNT_KEY)
+
+
+def set_video_count(count):
+    get_cache().set(VIDEO_COUNT_KEY, count, timeout=None)
+
+
+def adjust_video_count(delta):
+    try:
+        get_cache().incr(VIDEO_COUNT_KEY, delta)
+    except ValueError:  # not counted yet, leave it to the next count
+        pass
+
+
+def forget_video_count():
+    get_cache().delete(VIDEO_COUNT_KEY)
+
+
+# --- exposition
+
+
+def render():
+    """The Prometheus text exposition of collect() and the video count."""
+    samples = collect()
+    lines_by_name = {name: [] for name in METRICS}
+
+    for name, labels, value in sorted(samples["counters"], key=_sort_key):
+        lines_by_name[name].append(f"{name}{_labels(labels)} {_number(value)}")
+
+    for name, labels, sample in sorted(samples["histograms"], key=_sort_key):
+        lines = lines_by_name[name]
+        for bound, count in zip([*sample["bounds"], float("inf")], sample["buckets"]):
+            bucket_labels = {**labels, "le": _number(bound)}
+            lines.append(f"{name}_bucket{_labels(bucket_labels)} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(sample['sum'])}")
+        lines.append(f"{name}_count{_labels(labels)} {sample['count']}")
+
+    count = video_count()
+    if count is not None:
+        lines_by_name["video_collection_videos"].append(f"video_collection_videos {count}")
+
+    output = []
+    for name, (metric_type, help_text) in METRICS.items():
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {metric_type}")
+        output.extend(lines_by_name[name])
+    return "\n".join(output) + "\n"
+
+
+def _sort_key(sample):
+    name, labels, _ = sample
+    return name, sorted(labels.items())
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,38 @@
+import unicodedata
+
+from django.db import migrations, models
+
+
+def backfill_sort_key(apps, schema_editor):
+    # historical models don't have Video.save, so compute the key here.
+    # keep in step with models.sort_key_for
+    Video = apps.get_model("video_collection", "Video")
+    batch = []
+    for video in Video.objects.only("name").iterator(chunk_size=2000):
+        video.sort_key = unicodedata.normalize("NFKC", video.name).casefold()
+        batch.append(video)
+        if len(batch) == 2000:
+            Video.objects.bulk_update(batch, ["sort_key"])
+            batch = []
+    Video.objects.bulk_update(batch, ["sort_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("video_collection", "0002_video_video_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="sort_key",
+            field=models.CharField(default="", editable=False, max_length=600),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_sort_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="video",
+            index=models.Index(fields=["sort_key", "id"], name="video_sort_key_idx"),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+from video_collection.search import drop_fts_index, rebuild_fts_index
+
+
+def create_index(apps, schema_editor):
+    # rebuild so rows added before this migration get indexed
+    rebuild_fts_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_fts_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("video_collection", "0003_video_sort_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoSearchEntry",
+            fields=[
+                (
+                    "video",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="video_collection.video",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("notes", models.TextField()),
+                ("match", models.TextField(db_column="video_collection_video_fts")),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "video_collection_video_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
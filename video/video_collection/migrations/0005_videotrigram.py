@@ -0,0 +1,57 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+from video_collection.trigrams import trigrams
+
+
+def backfill_trigrams(apps, schema_editor):
+    Video = apps.get_model("video_collection", "Video")
+    VideoTrigram = apps.get_model("video_collection", "VideoTrigram")
+    batch = []
+    for pk, name in Video.objects.values_list("pk", "name").iterator(chunk_size=2000):
+        batch.extend(VideoTrigram(video_id=pk, trigram=gram) for gram in trigrams(name))
+        if len(batch) >= 5000:
+            VideoTrigram.objects.bulk_create(batch)
+            batch = []
+    VideoTrigram.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("video_collection", "0004_video_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoTrigram",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("trigram", models.CharField(max_length=3)),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trigrams",
+                        to="video_collection.video",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["trigram", "video"], name="video_trigram_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_trigrams, migrations.RunPython.noop),
+    ]
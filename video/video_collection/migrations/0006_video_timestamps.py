@@ -0,0 +1,34 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+from video_collection.search import create_fts_index
+
+
+def recreate_search_triggers(apps, schema_editor):
+    # SQLite adds these columns by rebuilding the table, which drops the
+    # full-text search triggers (see search.py)
+    create_fts_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("video_collection", "0005_videotrigram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(recreate_search_triggers, migrations.RunPython.noop),
+    ]
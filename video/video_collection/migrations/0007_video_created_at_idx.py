@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("video_collection", "0006_video_timestamps"),
+    ]
+
+    operations = [
+        # AddIndex is a CREATE INDEX even on SQLite, so the table isn't
+        # rebuilt and the search triggers survive
+        migrations.AddIndex(
+            model_name="video",
+            index=models.Index(fields=["created_at"], name="video_created_at_idx"),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("video_collection", "0007_video_created_at_idx"),
+    ]
+
+    operations = [
+        # a CREATE INDEX, like 0007, so the search triggers survive
+        migrations.AddIndex(
+            model_name="video",
+            index=models.Index(fields=["updated_at"], name="video_updated_at_idx"),
+        ),
+    ]
@@ -1,6 +1,150 @@
-from urllib import parse
-from django.db import models
-from django.core.exceptions import ValidationError
+import json
+import unicodedata
+from django.db import connections, models
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .trigrams import trigrams
+from .youtube import extract_video_id
+
+
+def sort_key_for(name):
+    # NFKC folds compatibility characters (full-width letters, ligatures) and
+    # casefold() is a more thorough lower() - e.g. "Straße" sorts with "strasse"
+    return unicodedata.normalize("NFKC", name).casefold()
+
+
+# sent after bulk_create, bulk_update or update() change videos without
+# going through Video.save, so per-video post_save receivers never ran, and
+# after the admin's delete action, which doesn't send post_delete either.
+# `added` and `removed` are how many videos that made or took away, added is
+# None when conflicting rows were skipped and nobody knows how many went in
+videos_bulk_changed = Signal()
+
+
+class VideoQuerySet(models.QuerySet):
+    # bulk paths skip Video.save and its signals, so they have to extract the
+    # video ID and fill in the sort key and the trigram index themselves
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = self._prepare(objs)
+        created = super().bulk_create(objs, *args, **kwargs)
+        # args are batch_size, ignore_conflicts, update_conflicts, ...
+        conflicts = (
+            any(args[1:3]) or kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts")
+        )
+        return self._created(created, counted=not conflicts)
+
+    def bulk_import(self, objs):
+        """
+        bulk_create for the import command: new videos only, no options, and
+        on SQLite sent as one statement (see _insert_json).
+        """
+        objs = self._prepare(objs)
+        if self._can_insert_json(objs):
+            created = self._insert_json(objs)
+        else:
+            created = super().bulk_create(objs)
+        return self._created(created)
+
+    def _prepare(self, objs):
+        objs = list(objs)
+        for obj in objs:
+            obj.video_id = extract_video_id(obj.url)
+            obj.sort_key = sort_key_for(obj.name)
+        return objs
+
+    def _created(self, created, counted=True):
+        created_with_pk = [obj for obj in created if obj.pk is not None]
+        VideoTrigram.objects.db_manager(self.db).index(created_with_pk, replace=False)
+        videos_bulk_changed.send(
+            sender=self.model, added=len(created_with_pk) if counted else None
+        )
+        return created
+
+    def _can_insert_json(self, objs):
+        connection = connections[self.db]
+        return (
+            connection.vendor == "sqlite"
+            and connection.features.can_return_rows_from_bulk_insert
+            and all(obj.pk is None for obj in objs)
+        )
+
+    def _insert_json(self, objs):
+        """
+        bulk_create as a single INSERT ... SELECT from a JSON array of the rows.
+        Django sends at most 999 parameters a statement to SQLite, so ~140
+        videos, and the full-text index writes out what it has buffered at the
+        end of every statement. Compiling those statements and converting each
+        value also costs more than SQLite's own work.
+        """
+        if not objs:
+            return objs
+        connection = connections[self.db]
+        fields = [field for field in self.model._meta.concrete_fields if not field.primary_key]
+        # like bulk_update, one timestamp for every video
+        now = timezone.now()
+        timestamp = connection.ops.adapt_datetimefield_value(now)
+        rows = []
+        for obj in objs:
+            row = []
+            for field in fields:
+                if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+                    setattr(obj, field.attname, now)
+                    row.append(timestamp)
+                else:
+                    row.append(field.get_db_prep_save(getattr(obj, field.attname), connection))
+            rows.append(row)
+
+        quote_name = connection.ops.quote_name
+        columns = ", ".join(quote_name(field.column) for field in fields)
+        values = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(fields)))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote_name(self.model._meta.db_table)} ({columns}) "
+                f"SELECT {values} FROM json_each(%s) "
+                f"RETURNING {quote_name(self.model._meta.pk.column)}, video_id",
+                [json.dumps(rows)],
+            )
+            # RETURNING rows come in no particular order, but video IDs are unique
+            pks = {video_id: pk for pk, video_id in cursor.fetchall()}
+        for obj in objs:
+            obj.pk = pks[obj.video_id]
+            obj._state.adding = False
+            obj._state.db = self.db
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        # auto_now only applies in save()
+        now = timezone.now()
+        fields = [*fields, "updated_at"]
+        for obj in objs:
+            obj.updated_at = now
+        if "name" in fields:
+            fields = [*fields, "sort_key"]
+            for obj in objs:
+                obj.sort_key = sort_key_for(obj.name)
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if "name" in fields:
+            VideoTrigram.objects.db_manager(self.db).index(objs)
+        videos_bulk_changed.send(sender=self.model)
+        return rows
+
+    def update(self, **kwargs):
+        kwargs.setdefault("updated_at", timezone.now())
+        name = kwargs.get("name")
+        if not isinstance(name, str):
+            rows = super().update(**kwargs)
+        else:
+            kwargs["sort_key"] = sort_key_for(name)
+            pks = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            VideoTrigram.objects.db_manager(self.db).index(
+                self.model(pk=pk, name=name) for pk in pks
+            )
+        videos_bulk_changed.send(sender=self.model)
+        return rows
 
 
 class Video(models.Model):
@@ -8,25 +152,33 @@ class Video(models.Model):
     url = models.CharField(max_length=400)
     notes = models.TextField(blank=True, null=True)
     video_id = models.CharField(max_length=40, unique=True)
+    # normalized copy of name, so lists can be ordered with an index instead of
+    # computing LOWER(name) for every row. casefolding can lengthen a string.
+    sort_key = models.CharField(max_length=600, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # indexed so the newest change (for ETags and Last-Modified) is a lookup
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = VideoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sort_key", "id"], name="video_sort_key_idx"),
+            # for the admin's date hierarchy
+            models.Index(fields=["created_at"], name="video_created_at_idx"),
+            # for the list's Last-Modified, see conditional.py
+            models.Index(fields=["updated_at"], name="video_updated_at_idx"),
+        ]
 
     def save(self, *args, **kwargs):
-        # checks for valid URL with an ID
-        # extract the ID + prevent save if invalid or ID not found
-        try:
-            url_components = parse.urlparse(self.url)
-            if url_components.scheme != "https" or url_components.netloc != "www.youtube.com" or url_components.path != "/watch":
-                raise ValidationError(f"Invalid YouTube URL {self.url}")
-
-            query_string = url_components.query
-            if not query_string:
-                raise ValidationError(f"Invalid YouTube URL {self.url}")
-            parameters = parse.parse_qs(query_string, strict_parsing=True)
-            parameter_list = parameters.get("v")
-            if not parameter_list:  # empty string, empty list
-                raise ValidationError(f"Invalid YouTube URL parameters {self.url}")
-            self.video_id = parameter_list[0]
-        except ValueError as e:
-            raise ValidationError(f"Unable to parse URL {self.url}") from e
+        self.sort_key = sort_key_for(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+            if "name" in update_fields:
+                kwargs["update_fields"].add("sort_key")
+
+        self.video_id = extract_video_id(self.url)
 
         super().save(*args, **kwargs)
 
@@ -35,3 +187,84 @@ class Video(models.Model):
         # can return any useful string here. try to truncate to max 200 chars
         return f"ID: {self.pk}, Name: {self.name}, URL: {self.url},\
             Video ID: {self.video_id}, Notes: {self.notes}"
+
+
+class VideoSearchEntry(models.Model):
+    """
+    Read-only view of the FTS5 index in search.py, so the ORM can join to it.
+    Rows are maintained by triggers, never save or delete these directly.
+    """
+
+    video = models.OneToOneField(
+        Video,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="search_entry",
+    )
+    name = models.TextField()
+    notes = models.TextField()
+    # FTS5's hidden column named after the table: "match = 'query'" is MATCH
+    match = models.TextField(db_column="video_collection_video_fts")
+    # hidden column holding the BM25 score, lower is better
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "video_collection_video_fts"
+
+
+class VideoTrigramManager(models.Manager):
+
+    def index(self, videos, replace=True):
+        """
+        Store trigrams for each of `videos` from its name, first removing the
+        ones it had unless `replace` is False (the videos are brand new).
+        """
+        videos = list(videos)
+        if not videos:
+            return
+        if replace:
+            self.filter(video__in=[video.pk for video in videos]).delete()
+
+        connection = connections[self.db]
+        if connection.vendor != "sqlite":
+            self.bulk_create(
+                [
+                    self.model(video_id=video.pk, trigram=gram)
+                    for video in videos
+                    for gram in trigrams(video.name)
+                ],
+                batch_size=1000,
+            )
+            return
+
+        # bulk_create would build a model instance for every row, and even
+        # executemany binds the ~30 trigrams per name one at a time. Instead
+        # they go over as one JSON document that SQLite unpacks itself. Rows
+        # go in video by video, so the rowid and video_id index are appended
+        # to, only the trigram index takes inserts all over
+        grams = json.dumps({video.pk: list(trigrams(video.name)) for video in videos})
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (trigram, video_id) "
+                "SELECT gram.value, CAST(video.key AS INTEGER) "
+                "FROM json_each(%s) AS video, json_each(video.value) AS gram",
+                [grams],
+            )
+
+
+class VideoTrigram(models.Model):
+    """One row per (trigram, video) pair, the inverted index for fuzzy name search."""
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="trigrams")
+    trigram = models.CharField(max_length=3)
+
+    objects = VideoTrigramManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["trigram", "video"], name="video_trigram_idx"),
+        ]
@@ -0,0 +1,109 @@
+import base64
+import binascii
+import json
+
+from django.db.models import F, Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(sort_value, pk):
+    raw = json.dumps([sort_value, pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    # cursors come straight from the query string, so don't trust them
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, pk = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError, RecursionError) as e:
+        # RecursionError from a cursor of thousands of nested [
+        raise InvalidCursor(cursor) from e
+    # sort values are names, or search ranks when paging through search results
+    if not isinstance(sort_value, (str, int, float)) or isinstance(sort_value, bool):
+        raise InvalidCursor(cursor)
+    if not isinstance(pk, int) or isinstance(pk, bool):
+        raise InvalidCursor(cursor)
+    return sort_value, pk
+
+
+def _position(item, key):
+    # model instances, or dicts from .values() (which must include key and "pk")
+    if isinstance(item, dict):
+        return item[key], item["pk"]
+    return getattr(item, key), item.pk
+
+
+class KeysetPage:
+    def __init__(self, items, key, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if items:
+            first, last = items[0], items[-1]
+            if has_next:
+                self.next_cursor = encode_cursor(*_position(last, key))
+            if has_previous:
+                self.previous_cursor = encode_cursor(*_position(first, key))
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(queryset, key, page_size, after=None, before=None):
+    """
+    Return one page of `queryset` ordered by (key, pk), starting just after the
+    `after` cursor or ending just before the `before` cursor.
+
+    Each page is a single indexed range scan with LIMIT page_size + 1, so the
+    cost doesn't depend on how deep into the list the user has paged (unlike
+    OFFSET, which has to walk every skipped row).
+    """
+    queryset = _page_queryset(queryset, key, page_size, after, before)
+    return _make_page(list(queryset), key, page_size, after, before)
+
+
+async def akeyset_paginate(queryset, key, page_size, after=None, before=None):
+    """Async version of keyset_paginate, for the async views."""
+    queryset = _page_queryset(queryset, key, page_size, after, before)
+    return _make_page([item async for item in queryset], key, page_size, after, before)
+
+
+def _page_queryset(queryset, key, page_size, after, before):
+    # the OR alone makes SQLite scan the index from one end until it gets to
+    # the cursor, so the redundant <= / >= is what lets it seek there instead
+    if before is not None:
+        value, pk = decode_cursor(before)
+        queryset = queryset.filter(
+            Q(**{f"{key}__lte": value}),
+            Q(**{f"{key}__lt": value}) | Q(**{key: value, "pk__lt": pk}),
+        ).order_by(F(key).desc(), "-pk")
+    else:
+        if after is not None:
+            value, pk = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(**{f"{key}__gte": value}),
+                Q(**{f"{key}__gt": value}) | Q(**{key: value, "pk__gt": pk}),
+            )
+        queryset = queryset.order_by(key, "pk")
+
+    # fetch one extra row to find out if there's another page without a COUNT
+    return queryset[: page_size + 1]
+
+
+def _make_page(items, key, page_size, after, before):
+    has_more = len(items) > page_size
+    items = items[:page_size]
+
+    if before is not None:
+        items.reverse()
+        return KeysetPage(items, key, has_next=True, has_previous=has_more)
+    return KeysetPage(items, key, has_next=has_more, has_previous=after is not None)
@@ -0,0 +1,123 @@
+"""
+Read replica routing. The video list (searches included) and detail pages
+read videos from the settings.VIDEO_READ_REPLICA database, everything else -
+adds, the admin, imports and exports - reads and writes the primary.
+
+Views opt in with read_from_replica, which sets a context variable for the
+length of the request that ReplicaRouter reads. A context variable rather
+than a thread local, so it follows the async views into sync_to_async.
+
+A replica can lag behind the primary, so after a POST (or any other write
+request) primary_stickiness_middleware sets a short-lived cookie, and while it
+is there that client reads from the primary too. Someone who has just added a
+video sees it on the redirect to the video list, however far behind the
+replica is. Other clients can see a change late by up to the replica's lag,
+plus settings.VIDEO_REPLICA_CACHE_TIMEOUT if a page rendered from the replica
+got cached (see read_timeout in cache.py).
+"""
+
+import functools
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+
+STICKY_COOKIE = "video_read_primary"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+_read_alias = ContextVar("video_collection_read_alias", default=None)
+
+
+def read_alias():
+    """The database this request reads videos from."""
+    return _read_alias.get() or DEFAULT_DB_ALIAS
+
+
+def _replica_for(request):
+    replica = settings.VIDEO_READ_REPLICA
+    if not replica or request.method not in SAFE_METHODS:
+        return None
+    if STICKY_COOKIE in request.COOKIES:
+        return None
+    return replica
+
+
+def read_from_replica(view):
+    """
+    Route the view's video reads to the replica, unless the client wrote
+    something recently. Goes outside condition() and cache_response, so their
+    queries (and cache keys, see read_alias) use the same database.
+    """
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_alias.set(_replica_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_alias.set(_replica_for(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Database router for settings.DATABASE_ROUTERS, see read_from_replica."""
+
+    app_label = "video_collection"
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+
+@sync_and_async_middleware
+def primary_stickiness_middleware(get_response):
+    """Pins a client that just wrote something to the primary for a while."""
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request):
+            response = await get_response(request)
+            _pin_after_write(request, response)
+            return response
+
+        return async_middleware
+
+    def middleware(request):
+        response = get_response(request)
+        _pin_after_write(request, response)
+        return response
+
+    return middleware
+
+
+def _pin_after_write(request, response):
+    if settings.VIDEO_READ_REPLICA and request.method not in SAFE_METHODS:
+        response.set_cookie(
+            STICKY_COOKIE,
+            "1",
+            max_age=settings.VIDEO_PRIMARY_STICKY_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
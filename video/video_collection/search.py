@@ -0,0 +1,215 @@
+"""
+Full-text search over Video name and notes with SQLite FTS5.
+
+The index is an external-content FTS5 table, so it stores only the inverted
+index and reads the text from video_collection_video. Triggers on the video
+table keep it in sync, which covers Video.save, the bulk paths and raw SQL.
+Django's SQLite backend rebuilds a table to alter it and that drops its
+triggers, so migrations that alter Video must call create_fts_index again.
+
+If FTS5 isn't compiled into SQLite, or the database isn't SQLite, search
+falls back to name__icontains.
+
+fuzzy_search_videos is the typo-tolerant alternative, ranking names by
+trigram similarity (see trigrams.py) using the VideoTrigram index.
+"""
+
+import math
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connections, DEFAULT_DB_ALIAS, OperationalError
+from django.db.models import Count, F
+
+from .models import VideoTrigram
+from .trigrams import similarity, trigrams
+
+FTS_TABLE = "video_collection_video_fts"
+
+# name matches count 10x as much as notes matches
+RANK_FUNCTION = "bm25(10.0, 1.0)"
+
+CREATE_FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, notes,
+        content='video_collection_video', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON video_collection_video
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, notes) VALUES (new.id, new.name, new.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON video_collection_video
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, notes)
+        VALUES ('delete', old.id, old.name, old.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, notes ON video_collection_video
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, notes)
+        VALUES ('delete', old.id, old.name, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, name, notes) VALUES (new.id, new.name, new.notes);
+    END
+    """,
+    # persistent config, makes the hidden rank column use our weights
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', '{RANK_FUNCTION}')",
+]
+
+DROP_FTS_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+TOKEN_RE = re.compile(r"\w+")
+
+# how many candidates per requested result get their similarity worked out
+FUZZY_CANDIDATES_PER_RESULT = 10
+
+# alias -> bool, so we only introspect once per process
+_available = {}
+
+
+def fts5_supported(connection):
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        except OperationalError:
+            return False
+        cursor.execute("DROP TABLE temp.fts5_probe")
+    return True
+
+
+def create_fts_index(connection):
+    """Create the index and triggers if FTS5 is available. Returns whether it did."""
+    if not fts5_supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        for sql in CREATE_FTS_SQL:
+            cursor.execute(sql)
+    _available.pop(connection.alias, None)
+    return True
+
+
+def drop_fts_index(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in DROP_FTS_SQL:
+            cursor.execute(sql)
+    _available.pop(connection.alias, None)
+
+
+def rebuild_fts_index(connection):
+    """(Re)create the index and triggers and reindex every video from scratch."""
+    if not create_fts_index(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def search_index_available(using=DEFAULT_DB_ALIAS):
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = FTS_TABLE in connection.introspection.table_names()
+    return _available[using]
+
+
+def fts_query(search_term):
+    """
+    Turn free text into an FTS5 query: every word must match (AND) and each
+    word also matches as a prefix, so "abb danc" finds "ABBA - Dancing Queen".
+    Returns None when there are no words to search for.
+    """
+    tokens = TOKEN_RE.findall(search_term)
+    if not tokens:
+        return None
+    # quoting each token stops FTS5 treating words like OR/NOT/NEAR as syntax
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_videos(queryset, search_term):
+    """
+    Filter `queryset` to videos matching `search_term`. Returns the filtered
+    queryset and the field to order (and paginate) it by: BM25 rank when the
+    FTS index is available, otherwise the name sort key.
+    """
+    query = fts_query(search_term)
+    if query is None or not search_index_available(queryset.db):
+        return queryset.filter(name__icontains=search_term), "sort_key"
+
+    queryset = queryset.filter(search_entry__match=query).annotate(
+        search_rank=F("search_entry__rank")
+    )
+    return queryset, "search_rank"
+
+
+async def asearch_videos(queryset, search_term):
+    """Async version of search_videos, for the async views."""
+    if queryset.db not in _available:
+        # introspection has no async API, but it only happens once per database
+        await sync_to_async(search_index_available)(queryset.db)
+    return search_videos(queryset, search_term)
+
+
+def fuzzy_search_videos(queryset, search_term, limit, threshold):
+    """
+    Return up to `limit` videos from `queryset` whose name has trigram
+    similarity >= `threshold` with `search_term`, best match first. Each
+    video gets a `similarity` attribute.
+    """
+    query_grams = trigrams(search_term)
+    if not query_grams:
+        return []
+    candidates = list(_fuzzy_candidates(queryset, query_grams, limit, threshold))
+    return _best_matches(
+        queryset.filter(pk__in=candidates), query_grams, limit, threshold
+    )
+
+
+async def afuzzy_search_videos(queryset, search_term, limit, threshold):
+    """Async version of fuzzy_search_videos, for the async views."""
+    query_grams = trigrams(search_term)
+    if not query_grams:
+        return []
+    candidates = [
+        pk async for pk in _fuzzy_candidates(queryset, query_grams, limit, threshold)
+    ]
+    videos = [video async for video in queryset.filter(pk__in=candidates)]
+    return _best_matches(videos, query_grams, limit, threshold)
+
+
+def _fuzzy_candidates(queryset, query_grams, limit, threshold):
+    # similarity = shared / (|query| + |name| - shared) and |name| >= shared,
+    # so a name reaching the threshold shares at least threshold * |query|
+    min_shared = max(1, math.ceil(threshold * len(query_grams)))
+    return (
+        VideoTrigram.objects.using(queryset.db)
+        .filter(trigram__in=query_grams)
+        .values("video")
+        .annotate(shared=Count("*"))
+        .filter(shared__gte=min_shared)
+        .order_by("-shared")
+        .values_list("video", flat=True)[: limit * FUZZY_CANDIDATES_PER_RESULT]
+    )
+
+
+def _best_matches(videos, query_grams, limit, threshold):
+    matches = []
+    for video in videos:
+        video.similarity = similarity(query_grams, trigrams(video.name))
+        if video.similarity >= threshold:
+            matches.append(video)
+    matches.sort(key=lambda video: (-video.similarity, video.sort_key, video.pk))
+    return matches[:limit]
@@ -0,0 +1,111 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, cache, conditional, hot, metrics, sqlite, timing
+from .models import Video, VideoTrigram, videos_bulk_changed
+
+
+@receiver(post_save, sender=Video)
+def index_video_trigrams(sender, instance, using, update_fields=None, **kwargs):
+    # trigram rows go away with the video through the foreign key cascade,
+    # so only saves need handling here
+    if update_fields is not None and "name" not in update_fields:
+        return
+    VideoTrigram.objects.db_manager(using).index([instance])
+
+
+# the in-memory autocomplete index can't be rolled back, so it only hears
+# about changes once they're committed
+
+
+@receiver(post_save, sender=Video)
+def update_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(partial(autocomplete.video_saved, instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Video)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(partial(autocomplete.video_deleted, instance.pk))
+
+
+@receiver(videos_bulk_changed, sender=Video)
+def reset_autocomplete(sender, **kwargs):
+    transaction.on_commit(autocomplete.reset)
+
+
+# bumped straight away so this process never serves a page from before the
+# change, and again on commit in case another request cached a page from
+# before the commit in between. the autocomplete index has heard about the
+# change by then (its receivers come first), so it moves on with the version
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+@receiver(videos_bulk_changed, sender=Video)
+def invalidate_cached_pages(sender, **kwargs):
+    bump_version()
+    transaction.on_commit(bump_version)
+
+
+def bump_version():
+    autocomplete.version_bumped(cache.bump_version())
+
+
+# straight away, as the hot objects are only in this process's memory
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def forget_hot_video(sender, instance, **kwargs):
+    hot.forget(instance)
+
+
+@receiver(videos_bulk_changed, sender=Video)
+def clear_hot_videos(sender, **kwargs):
+    hot.clear()
+
+
+@receiver(post_save, sender=Video)
+def count_added_video(sender, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(metrics.adjust_video_count, 1))
+
+
+@receiver(post_delete, sender=Video)
+def count_deleted_video(sender, **kwargs):
+    transaction.on_commit(partial(metrics.adjust_video_count, -1))
+
+
+@receiver(videos_bulk_changed, sender=Video)
+def count_bulk_changes(sender, added=0, removed=0, **kwargs):
+    if added is None:
+        # conflicting rows were skipped, so recount next time
+        transaction.on_commit(metrics.forget_video_count)
+    elif added or removed:
+        transaction.on_commit(partial(metrics.adjust_video_count, added - removed))
+
+
+@receiver(post_delete, sender=Video)
+def record_deletion(sender, **kwargs):
+    conditional.record_deletion(timezone.now())
+
+
+@receiver(videos_bulk_changed, sender=Video)
+def record_bulk_deletion(sender, removed=0, **kwargs):
+    if removed:
+        conditional.record_deletion(timezone.now())
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    sqlite.configure_connection(connection)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    timing.install_query_timer(connection)
@@ -0,0 +1,21 @@
+"""
+Per-connection SQLite tuning, applied to every new connection (see signals.py)
+from settings.SQLITE_PRAGMAS.
+
+With the default rollback journal a write locks the whole file, so a slow add
+blocks every list page until it commits. In WAL mode readers carry on reading
+the last committed state while one writer appends to the log, and
+synchronous=NORMAL is safe there: a power cut can lose the last few commits
+but never corrupts the database. busy_timeout makes a second writer wait for
+the lock rather than fail straight away with "database is locked".
+"""
+
+from django.conf import settings
+
+
+def configure_connection(connection):
+    if connection.vendor != "sqlite":
+        return
+    # on the raw connection, so test query counts don't include the pragmas
+    for pragma, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f"PRAGMA {pragma} = {value}")
@@ -0,0 +1,17 @@
+from django import template
+from django.template.loader import render_to_string
+
+from ..fragments import row_cache
+
+register = template.Library()
+
+
+@register.simple_tag
+def video_row(video, embed_mode):
+    """One video in the list, rendered from video_row.html or the row cache."""
+    return row_cache.get_or_render(
+        (video.pk, video.updated_at, embed_mode),
+        lambda: render_to_string(
+            "video_collection/video_row.html", {"video": video, "embed_mode": embed_mode}
+        ),
+    )
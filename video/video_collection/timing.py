@@ -0,0 +1,173 @@
+"""
+Per-request timing: database queries (count and time), template rendering
+and the whole request, sent back in a Server-Timing header so the browser's
+dev tools show where the time went.
+
+Queries are timed by an execute wrapper installed on every new database
+connection (see signals.py) and templates by TimedDjangoTemplates, the
+template backend in settings.TEMPLATES. Both add to the RequestTimings of the
+request being served, found through a context variable, so they follow async
+views into sync_to_async and do nothing outside a request. The cost is a few
+perf_counter() calls per query and per page, cheap enough to leave on (see
+`manage.py benchmark instrumentation`).
+
+Requests slower than settings.VIDEO_SLOW_REQUEST_MS are logged as warnings
+with their SQL, and every request's time and query count are recorded per
+URL name in metrics.py.
+"""
+
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# slow request logs show at most this many statements
+MAX_LOGGED_QUERIES = 50
+
+_current = ContextVar("video_collection_request_timings", default=None)
+
+
+class RequestTimings:
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.queries = []  # (sql, seconds)
+        self._render_depth = 0
+
+    def header(self, total_seconds):
+        return ", ".join([
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.query_count} queries"',
+            f"tpl;dur={self.template_seconds * 1000:.2f}",
+            f"total;dur={total_seconds * 1000:.2f}",
+        ])
+
+
+def current_timings():
+    """The RequestTimings of the request being served, None outside one."""
+    return _current.get()
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper (connection.execute_wrappers) adding to the request's timings."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        timings.query_count += 1
+        timings.db_seconds += elapsed
+        if len(timings.queries) < MAX_LOGGED_QUERIES:
+            timings.queries.append((sql, elapsed))
+
+
+def install_query_timer(connection):
+    # connection_created fires again when a wrapper reconnects
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class TimedTemplate:
+    """A backend template whose render() adds to the request's template time."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return self.template.render(context, request)
+        # rows and includes rendered from inside a page are part of its time
+        timings._render_depth += 1
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings._render_depth -= 1
+            if not timings._render_depth:
+                timings.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times recorded."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Times each request, see the module docstring."""
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request):
+            timings = RequestTimings()
+            token = _current.set(timings)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            _finish(request, response, timings, time.perf_counter() - start)
+            return response
+
+        return async_middleware
+
+    def middleware(request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(request, response, timings, time.perf_counter() - start)
+        return response
+
+    return middleware
+
+
+def _finish(request, response, timings, total_seconds):
+    response["Server-Timing"] = timings.header(total_seconds)
+
+    match = request.resolver_match
+    url_name = match.url_name if match and match.url_name else "<unmatched>"
+    # X-Cache is set by cache_response, on the pages it caches
+    cache_result = response.get("X-Cache")
+    metrics.observe_request(
+        url_name,
+        response.status_code,
+        total_seconds,
+        timings.query_count,
+        cache_result.lower() if cache_result else None,
+    )
+
+    total_ms = total_seconds * 1000
+    if total_ms > settings.VIDEO_SLOW_REQUEST_MS:
+        logger.warning(
+            "Slow request: %s %s took %.1f ms (%d queries, %.1f ms in the database)\n%s",
+            request.method,
+            request.get_full_path(),
+            total_ms,
+            timings.query_count,
+            timings.db_seconds * 1000,
+            "\n".join(f"{seconds * 1000:8.2f} ms  {sql}" for sql, seconds in timings.queries),
+        )
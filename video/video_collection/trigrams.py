@@ -0,0 +1,31 @@
+"""
+Trigram helpers for typo-tolerant name search, along the lines of pg_trgm.
+
+A name is casefolded and split into words, each word is padded with two
+spaces in front and one behind, and every run of three characters is a
+trigram. "Cat" becomes {"  c", " ca", "cat", "at "}. Two names are similar
+when they share a large fraction of their trigrams, which survives typos
+that would break a substring or prefix match.
+"""
+
+import re
+import unicodedata
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def trigrams(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    grams = set()
+    for word in WORD_RE.findall(text):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets, from 0 (nothing shared) to 1."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
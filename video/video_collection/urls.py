@@ -1,10 +1,56 @@
-from django.urls import path
-from django.contrib.staticfiles.urls import staticfiles_urlpatterns
-from . import views
-
-urlpatterns = [
-    path("", views.home, name="home"),
-    path("add", views.add, name="add_video"),
-    path("video_list", views.video_list, name="video_list"),
-    path("video_detail/<int:video_pk>", views.video_detail, name="video_detail")
-] + staticfiles_urlpatterns()
+import re
+import types
+
+from django.conf import settings
+from django.urls import path, re_path, register_converter
+from . import api, assets, async_views, views
+
+
+class VideoIdConverter:
+    # YouTube's, see youtube.py
+    regex = "[A-Za-z0-9_-]{11}"
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+register_converter(VideoIdConverter, "video_id")
+
+
+def build_urlpatterns(page_views):
+    # home, add, list and detail come from `page_views` (views or async_views)
+    return [
+        path("", page_views.home, name="home"),
+        path("add", page_views.add, name="add_video"),
+        path("video_list", page_views.video_list, name="video_list"),
+        path("autocomplete", views.autocomplete_names, name="autocomplete"),
+        path("export", views.export, name="export_videos"),
+        path("metrics", views.metrics_page, name="metrics"),
+        path("video_detail/<int:video_pk>", page_views.video_detail, name="video_detail"),
+        path("v/<video_id:video_id>", page_views.video_detail, name="video_detail_by_id"),
+        path("api/videos", api.video_list, name="api_video_list"),
+        path("api/videos/<int:video_pk>", api.video_detail, name="api_video_detail"),
+        path("api/v/<video_id:video_id>", api.video_detail, name="api_video_detail_by_id"),
+    ] + static_urlpatterns()
+
+
+def static_urlpatterns():
+    # static files are served by the app, see assets.py, unless STATIC_URL
+    # points at another host
+    if "://" in settings.STATIC_URL:
+        return []
+    prefix = re.escape(settings.STATIC_URL.lstrip("/"))
+    return [re_path(rf"^{prefix}(?P<path>.+)$", assets.serve, name="static")]
+
+
+def urlconf_for(page_views):
+    """A URLconf module (for ROOT_URLCONF) serving the pages from `page_views`."""
+    module = types.ModuleType(f"video_collection.urls.{page_views.__name__}")
+    module.urlpatterns = build_urlpatterns(page_views)
+    return module
+
+
+urlpatterns = build_urlpatterns(async_views if settings.VIDEO_ASYNC_VIEWS else views)
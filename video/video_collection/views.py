@@ -1,13 +1,28 @@
-from django.forms import ValidationError
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.db import IntegrityError
-from django.db.models.functions import Lower
-from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect
+from django.views.decorators.http import condition
 from django.contrib import messages
 
+from . import autocomplete, hot, metrics
+from .cache import cache_response
+from .conditional import (
+    detail_etag,
+    detail_last_modified,
+    list_etag,
+    list_last_modified,
+)
+from .export import CONTENT_TYPES, export_videos
 from .models import Video
 from .forms import SearchForm, VideoForm
+from .pagination import InvalidCursor, keyset_paginate
+from .routing import read_from_replica
 
 
+@cache_response
 def home(request):
     app_name = "Music Videos"
     return render(request, "video_collection/home.html", {"app_name": app_name})
@@ -20,12 +35,19 @@ def add(request):
             try:
                 new_video_form.save()  # create new Video and save it
                 return redirect("video_list")
-            except ValidationError:
-                messages.warning(request, "Invalid YouTube URL")
             except IntegrityError:
+                # someone else added it between the form's check and our save
+                metrics.inc("video_add_failures_total", reason="duplicate")
                 messages.warning(request, "You already added that video")
+        elif new_video_form.has_error("url", "invalid_youtube_url"):
+            metrics.inc("video_add_failures_total", reason="invalid_url")
+            messages.warning(request, "Invalid YouTube URL")
+        elif new_video_form.has_error("url", "duplicate"):
+            metrics.inc("video_add_failures_total", reason="duplicate")
+            messages.warning(request, "You already added that video")
+        else:
+            messages.warning(request, "Please check the data entered.")
 
-        messages.warning(request, "Please check the data entered.")
         return render(
             request, "video_collection/add.html", {"new_video_form": new_video_form}
         )
@@ -36,25 +58,149 @@ def add(request):
     )
 
 
+@metrics.count_searches("search_term")
+@read_from_replica
+@condition(etag_func=list_etag, last_modified_func=list_last_modified)
+@cache_response
 def video_list(request):
     search_form = SearchForm(request.GET)
+    videos = Video.objects.all()
+    sort_key = "sort_key"
 
     # code like this is what makes me love python. it's like pseudocode you can run!
     if search_form.is_valid():
         search_term = search_form.cleaned_data["search_term"]
-        videos = Video.objects.filter(name__icontains=search_term).order_by(Lower("name"))
+        if search_form.cleaned_data["fuzzy"]:
+            # fuzzy search returns only the top matches, so there's no paging
+            videos = search_form.fuzzy_search(videos)
+            metrics.record_search(request, len(videos))
+            return render(
+                request,
+                "video_collection/video_list.html",
+                {
+                    "videos": videos,
+                    "total_count": len(videos),
+                    "search_form": search_form,
+                    "embed_mode": _embed_mode("video_list"),
+                },
+            )
+        videos, sort_key = search_form.search(videos)
     else:
+        search_term = None
         search_form = SearchForm()
-        videos = Video.objects.order_by(Lower("name"))
+
+    try:
+        page = keyset_paginate(
+            videos,
+            sort_key,
+            _page_size(request),
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
+    except InvalidCursor:
+        raise Http404("Invalid page")
+
+    # COUNT(*) doesn't load any rows, so it stays cheap next to the page query
+    total_count = videos.count()
+    if search_term is not None:
+        metrics.record_search(request, total_count)
 
     return render(
         request,
         "video_collection/video_list.html",
-        {"videos": videos, "search_form": search_form},
+        {
+            "videos": page,
+            "page": page,
+            "total_count": total_count,
+            "next_query": _page_query(request, search_term, after=page.next_cursor),
+            "previous_query": _page_query(
+                request, search_term, before=page.previous_cursor
+            ),
+            "search_form": search_form,
+            "embed_mode": _embed_mode("video_list"),
+        },
     )
 
 
-def video_detail(request, video_pk):
-    video = get_object_or_404(Video, pk=video_pk)
+def _embed_mode(view_name):
+    # "iframe" or "facade", see VIDEO_EMBED_MODES in settings
+    return settings.VIDEO_EMBED_MODES.get(view_name, "iframe")
+
+
+def _page_size(request):
+    try:
+        page_size = int(request.GET.get("page_size", settings.VIDEO_LIST_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.VIDEO_LIST_PAGE_SIZE
+    return max(1, min(page_size, settings.VIDEO_LIST_MAX_PAGE_SIZE))
+
+
+def _page_query(request, search_term, **cursor):
+    # builds the query string for a next/prev link, keeping the search term
+    # and page size so paging through search results stays in the results
+    (direction, value), = cursor.items()
+    if value is None:
+        return None
+    params = {}
+    if search_term is not None:
+        params["search_term"] = search_term
+    if "page_size" in request.GET:
+        params["page_size"] = request.GET["page_size"]
+    params[direction] = value
+    return urlencode(params)
+
+
+def autocomplete_names(request):
+    # served from the in-memory prefix index, no database query per keystroke
+    prefix = request.GET.get("q", "").strip()
+    try:
+        limit = int(request.GET.get("limit", settings.AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.AUTOCOMPLETE_LIMIT
+    limit = max(1, min(limit, settings.AUTOCOMPLETE_LIMIT))
+
+    suggestions = autocomplete.complete(prefix, limit) if prefix else []
+    return JsonResponse({"suggestions": suggestions})
+
 
-    return render(request, "video_collection/video_detail.html", {"video": video})
+def metrics_page(request):
+    # for Prometheus to scrape, see metrics.py
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def export(request):
+    # streamed straight from the database, so the whole collection is never
+    # held in memory however big it gets
+    export_format = request.GET.get("format", "ndjson")
+    if export_format not in CONTENT_TYPES:
+        raise Http404("Unknown export format")
+    compress = request.GET.get("gzip") == "1"
+
+    filename = f"videos.{export_format}"
+    content_type = CONTENT_TYPES[export_format]
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(
+        export_videos(Video.objects.all(), export_format, compress=compress),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@read_from_replica
+@condition(etag_func=detail_etag, last_modified_func=detail_last_modified)
+@cache_response
+def video_detail(request, video_pk=None, video_id=None):
+    # by pk, or by YouTube video ID at /v/<video_id>
+    video = hot.get_video(*hot.detail_lookup(video_pk, video_id))
+    if video is None:
+        raise Http404("No Video matches the given query.")
+
+    return render(
+        request,
+        "video_collection/video_detail.html",
+        {"video": video, "embed_mode": _embed_mode("video_detail")},
+    )
@@ -0,0 +1,52 @@
+"""
+Extracting the video ID from the YouTube URLs people paste.
+
+Accepted shapes, all https:
+
+    www/m/music.youtube.com/watch?v=ID (other query parameters allowed)
+    youtube.com/shorts/ID, youtube.com/embed/ID (any of the hosts above)
+    youtu.be/ID
+
+A video ID is exactly 11 characters from A-Z, a-z, 0-9, - and _.
+
+Everything is matched by one precompiled regular expression, and the most
+recent results are memoized since the same URL usually gets parsed more than
+once (form validation, then Video.save).
+"""
+
+import functools
+import re
+
+from django.core.exceptions import ValidationError
+
+VIDEO_URL_RE = re.compile(
+    r"""
+    https://
+    (?:
+        (?:(?:www|m|music)\.)?youtube\.com/
+        (?:
+            watch\?(?:[^#]*?&)?v=(?P<watch_id>[\w-]{11})(?=[&#]|$)
+          | (?:shorts|embed)/(?P<path_id>[\w-]{11})(?=[?#]|$)
+        )
+      | youtu\.be/(?P<short_id>[\w-]{11})(?=[?#]|$)
+    )
+    """,
+    re.VERBOSE | re.ASCII,
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_video_id(url):
+    """Return the video ID in `url`, or None if it isn't a YouTube video URL."""
+    match = VIDEO_URL_RE.match(url)
+    if match is None:
+        return None
+    return match["watch_id"] or match["path_id"] or match["short_id"]
+
+
+def extract_video_id(url):
+    """Like parse_video_id, but raises ValidationError for an invalid URL."""
+    video_id = parse_video_id(url)
+    if video_id is None:
+        raise ValidationError(f"Invalid YouTube URL {url}", code="invalid_youtube_url")
+    return video_id